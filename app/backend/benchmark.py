@@ -0,0 +1,132 @@
+"""Throughput benchmarks, run inside the container against real PDFs.
+
+    python -m app.backend.benchmark ocr /data/skany --pages 50
+    python -m app.backend.benchmark extract /data --pages 2000
+
+``ocr`` renders up to ``--pages`` pages once at OCR_MAX_DPI and then runs
+every available OCR engine over the same images in a single thread,
+reporting pages per second and how much of the text the engines agree on.
+
+``extract`` does the same for the text extraction backends: each one reads
+the text layer of the same PDFs (up to ``--pages`` pages), and the page
+texts are compared with whitespace normalised, since the backends lay out
+lines differently.
+"""
+
+import argparse
+import difflib
+import tempfile
+import time
+from pathlib import Path
+
+from pdf2image import convert_from_path
+
+from app.backend.extract import EXTRACTORS
+from app.backend.indexer import OCR_GRAYSCALE, OCR_MAX_DPI
+from app.backend.ocr import ENGINES
+
+
+def _pdfs(directory: Path) -> list[Path]:
+    return sorted(directory.rglob("*.pdf"))
+
+
+def _render_sample(directory: Path, max_pages: int, output_folder: str) -> list[str]:
+    paths: list[str] = []
+    for pdf in _pdfs(directory):
+        if len(paths) >= max_pages:
+            break
+        paths += convert_from_path(
+            str(pdf),
+            dpi=OCR_MAX_DPI,
+            grayscale=OCR_GRAYSCALE,
+            last_page=max_pages - len(paths),
+            output_folder=output_folder,
+            paths_only=True,
+        )
+    return paths
+
+
+def bench_ocr(directory: Path, max_pages: int) -> None:
+    with tempfile.TemporaryDirectory(prefix="pdf_search_bench_") as tmp:
+        images = _render_sample(directory, max_pages, tmp)
+        if not images:
+            print(f"No PDF pages found in {directory}")
+            return
+        print(f"{len(images)} pages rendered at {OCR_MAX_DPI} dpi\n")
+
+        texts: dict[str, list[str]] = {}
+        for name, engine_cls in ENGINES.items():
+            try:
+                engine = engine_cls()
+            except Exception as e:
+                print(f"{name:12s} unavailable: {e}")
+                continue
+            start = time.perf_counter()
+            texts[name] = [engine.recognize(path).text for path in images]
+            elapsed = time.perf_counter() - start
+            print(
+                f"{name:12s} {len(images) / elapsed:7.2f} pages/s "
+                f"({elapsed:.1f} s total)"
+            )
+
+    if len(texts) == 2:
+        a, b = texts.values()
+        ratio = sum(
+            difflib.SequenceMatcher(None, x, y).ratio() for x, y in zip(a, b)
+        ) / len(a)
+        print(f"\nmean text similarity between engines: {ratio:.3f}")
+
+
+def bench_extract(directory: Path, max_pages: int) -> None:
+    texts: dict[str, list[str]] = {}
+    for name, extractor_cls in EXTRACTORS.items():
+        extractor = extractor_cls()
+        pages: list[str] = []
+        start = time.perf_counter()
+        try:
+            for pdf in _pdfs(directory):
+                if len(pages) >= max_pages:
+                    break
+                _, infos = extractor.extract(str(pdf), 1, max_pages - len(pages))
+                pages += [" ".join(info.text.split()) for info in infos]
+        except Exception as e:
+            print(f"{name:12s} unavailable: {e}")
+            continue
+        elapsed = time.perf_counter() - start
+        texts[name] = pages
+        print(
+            f"{name:12s} {len(pages) / elapsed:7.2f} pages/s "
+            f"({len(pages)} pages, {elapsed:.1f} s total)"
+        )
+
+    if len(texts) == 2:
+        a, b = texts.values()
+        if not a or len(a) != len(b):
+            return
+        ratio = sum(
+            difflib.SequenceMatcher(None, x, y).ratio() for x, y in zip(a, b)
+        ) / len(a)
+        print(f"\nmean text similarity between extractors: {ratio:.3f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.backend.benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ocr = sub.add_parser("ocr", help="compare OCR engines on the same pages")
+    ocr.add_argument("directory", type=Path)
+    ocr.add_argument("--pages", type=int, default=50)
+
+    extract = sub.add_parser("extract", help="compare text extraction backends")
+    extract.add_argument("directory", type=Path)
+    extract.add_argument("--pages", type=int, default=1000)
+
+    args = parser.parse_args()
+    if args.command == "ocr":
+        bench_ocr(args.directory, args.pages)
+    elif args.command == "extract":
+        bench_extract(args.directory, args.pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Memory budget shared by all indexing worker processes.
+
+Rendering a page for OCR costs roughly width x height bytes at the OCR
+resolution (x 3 with OCR_GRAYSCALE=0), which for large-format scans runs
+into hundreds of megabytes.
+Workers reserve the estimated cost before rendering and release it once
+OCR of those pages is done, so the total across the pool stays bounded.
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+class MemoryBudget:
+    """Cross-process counter of reserved bytes, blocking above ``limit``."""
+
+    def __init__(self, limit: int, ctx) -> None:
+        self.limit = limit
+        self._used = ctx.Value("q", 0, lock=False)
+        self._cond = ctx.Condition()
+
+    def acquire(self, nbytes: int) -> int:
+        """Wait until ``nbytes`` fit in the budget and reserve them.
+
+        A request larger than the whole budget is clamped to it, so it runs
+        alone rather than never. Returns the amount actually reserved.
+        """
+        nbytes = min(nbytes, self.limit)
+        with self._cond:
+            while self._used.value + nbytes > self.limit:
+                self._cond.wait()
+            self._used.value += nbytes
+        return nbytes
+
+    def release(self, nbytes: int) -> None:
+        with self._cond:
+            self._used.value -= nbytes
+            self._cond.notify_all()
+
+    def release_when_done(self, futures: list[Future], nbytes: int) -> None:
+        """Release ``nbytes`` once every future in ``futures`` has finished."""
+        if not futures:
+            self.release(nbytes)
+            return
+        remaining = len(futures)
+        lock = threading.Lock()
+
+        def done(_: Future) -> None:
+            nonlocal remaining
+            with lock:
+                remaining -= 1
+                last = remaining == 0
+            if last:
+                self.release(nbytes)
+
+        for future in futures:
+            future.add_done_callback(done)
+
+    @property
+    def used(self) -> int:
+        with self._cond:
+            return self._used.value
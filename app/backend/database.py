@@ -1,206 +1,758 @@
+import logging
+import os
+import posixpath
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Iterator, NamedTuple
 
+from app.backend.migrations import db_size, migrate
+
+logger = logging.getLogger(__name__)
+
+# The index a full rebuild replaces is DB_PATH or a generation file next to
+# it; the pointer file names the one in use (none means DB_PATH).
 DB_PATH = Path("/data/.pdf_search_index.db")
+READER_POOL_SIZE = int(os.environ.get("DB_READER_POOL_SIZE", "8"))
+BULK_LOAD_CACHE_MB = int(os.environ.get("BULK_LOAD_CACHE_MB", "256"))
+STATEMENT_CACHE_SIZE = 256
+
+
+class ConnectionManager:
+    """Long-lived writer connection plus a bounded set of thread-local readers.
+
+    SQLite allows one writer at a time, so all writes share a single
+    connection guarded by a lock. Readers get one connection per thread,
+    created lazily and reused; a semaphore caps how many read at once.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_readers: int = READER_POOL_SIZE,
+        auto_vacuum: str | None = None,
+    ) -> None:
+        self.path = path
+        self.auto_vacuum = auto_vacuum
+        self._write_lock = threading.RLock()
+        self._writer_conn: sqlite3.Connection | None = None
+        self._read_slots = threading.BoundedSemaphore(max_readers)
+        self._local = threading.local()
+        self._readers: list[sqlite3.Connection] = []
+        self._busy: set[sqlite3.Connection] = set()
+        self._readers_lock = threading.Lock()
+        self._generation = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            str(self.path),
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        if self.auto_vacuum:
+            # Only takes effect on a new file, before anything (even the
+            # switch to WAL) has written its header.
+            conn.execute(f"PRAGMA auto_vacuum={self.auto_vacuum}")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Yield the writer connection inside a transaction."""
+        with self._write_lock:
+            if self._writer_conn is None:
+                self._writer_conn = self._connect()
+            conn = self._writer_conn
+            with conn:
+                yield conn
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Yield this thread's read-only connection."""
+        with self._read_slots:
+            conn = getattr(self._local, "conn", None)
+            if conn is None or self._local.generation != self._generation:
+                if conn is not None:
+                    self._discard_reader(conn)
+                conn = self._connect()
+                conn.execute("PRAGMA query_only=ON")
+                self._local.conn = conn
+                self._local.generation = self._generation
+                with self._readers_lock:
+                    self._readers.append(conn)
+            with self._readers_lock:
+                self._busy.add(conn)
+            try:
+                yield conn
+            finally:
+                with self._readers_lock:
+                    self._busy.discard(conn)
+                    stale = self._local.generation != self._generation
+                if stale:
+                    # switch() happened mid-query: let go of the old file now.
+                    self._discard_reader(conn)
+                    self._local.conn = None
+
+    def _discard_reader(self, conn: sqlite3.Connection) -> None:
+        with self._readers_lock:
+            if conn in self._readers:
+                self._readers.remove(conn)
+        conn.close()
+
+    def close(self) -> None:
+        """Close every connection; threads reconnect on next use."""
+        with self._write_lock, self._readers_lock:
+            self._generation += 1
+            if self._writer_conn is not None:
+                self._writer_conn.close()
+                self._writer_conn = None
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+
+    def switch(self, path: Path) -> None:
+        """Move to another database file.
+
+        Idle readers are closed at once; readers in the middle of a query
+        finish it on the old file and reconnect afterwards.
+        """
+        with self._write_lock, self._readers_lock:
+            self.path = path
+            self._generation += 1
+            if self._writer_conn is not None:
+                self._writer_conn.close()
+                self._writer_conn = None
+            for conn in self._readers:
+                if conn not in self._busy:
+                    conn.close()
+            self._readers = [c for c in self._readers if c in self._busy]
+
+
+_db = ConnectionManager(DB_PATH)  # the generation searches are served from
+_staging: ConnectionManager | None = None  # the generation being rebuilt, if any
+
+
+_fts_deferred = False  # set during a bulk load; the FTS index is built at the end
+
 
+def _index() -> ConnectionManager:
+    """Generation the indexer reads and writes."""
+    return _staging or _db
 
-def _get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.execute("PRAGMA journal_mode=WAL")
-    conn.execute("PRAGMA foreign_keys=ON")
-    conn.row_factory = sqlite3.Row
-    return conn
+
+class Page(NamedTuple):
+    number: int
+    text: str
+    method: str  # "text", "ocr" or "skip"
+    reason: str  # why the classifier chose that method
+
+
+class FileStat(NamedTuple):
+    size: int
+    mtime_ns: int
+    inode: int
+
+    @classmethod
+    def of(cls, path: Path) -> "FileStat":
+        st = path.stat()
+        return cls(st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class FileRecord(NamedTuple):
+    file_hash: str
+    stat: FileStat | None  # None for files indexed before stats were kept
+    verified_at: int | None  # unix time the hash was last checked against disk
+
+
+def _pointer_path() -> Path:
+    return DB_PATH.with_suffix(".current")
+
+
+def _live_path() -> Path:
+    try:
+        name = _pointer_path().read_text().strip()
+    except FileNotFoundError:
+        return DB_PATH
+    return DB_PATH.with_name(name)
 
 
 def init_db() -> None:
-    conn = _get_conn()
+    live = _live_path()
+    _db.switch(live)
+    with _db.writer() as conn:
+        migrate(conn)
+        if conn.execute(
+            "SELECT 1 FROM index_state WHERE key = 'fts_rebuild_pending'"
+        ).fetchone():
+            # A bulk load was cut short: the pages it stored are not in the
+            # FTS index yet, and deleting them from it would corrupt it.
+            logger.warning("Interrupted bulk load, building the full-text index")
+            _rebuild_fts(conn)
+    # Rebuilds interrupted by a restart, and generations not yet dropped.
+    for path in [DB_PATH, *DB_PATH.parent.glob(f"{DB_PATH.stem}.*.db")]:
+        if path != live and path.exists():
+            _drop_generation_async(path)
+
+
+def begin_rebuild() -> None:
+    """Start an empty index generation for the indexer to fill.
+
+    Searches keep using the current generation until finish_rebuild().
+    """
+    global _staging
+    path = DB_PATH.with_name(f"{DB_PATH.stem}.{time.time_ns()}.db")
+    staging = ConnectionManager(path)
+    with staging.writer() as conn:
+        migrate(conn)
+    _staging = staging
+    logger.info("Rebuilding the index into %s", path.name)
+
+
+def finish_rebuild() -> None:
+    """Make the rebuilt generation current and drop the old one."""
+    global _staging
+    staging, _staging = _staging, None
+    staging.close()
+    pointer = _pointer_path()
+    tmp = pointer.with_name(pointer.name + ".tmp")
+    with open(tmp, "w") as f:
+        f.write(staging.path.name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pointer)
+    old = _db.path
+    _db.switch(staging.path)
+    logger.info("Switched to index generation %s", staging.path.name)
+    _drop_generation_async(old)
+
+
+@contextmanager
+def bulk_load() -> Iterator[dict]:
+    """Fill an empty index faster; yields a dict that receives the timings.
+
+    Until the block exits, the writer skips fsyncs (synchronous=OFF; WAL
+    still protects against a crashed process, just not a power cut), works
+    with a large page cache and in-memory temp tables, and leaves the FTS
+    index alone. On exit the FTS index is built from pdf_pages in one pass,
+    which is much faster than maintaining it row by row, and the previous
+    settings are restored. Pages stored meanwhile are not searchable yet.
+    The pending build is recorded in index_state, so init_db() does it if
+    the process dies first.
+    """
+    global _fts_deferred
+    pragmas = ("synchronous", "cache_size", "temp_store")
+    with _index().writer() as conn:
+        saved = {p: conn.execute(f"PRAGMA {p}").fetchone()[0] for p in pragmas}
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute(f"PRAGMA cache_size = {-BULK_LOAD_CACHE_MB * 1024}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute(
+            "INSERT OR REPLACE INTO index_state (key, value) "
+            "VALUES ('fts_rebuild_pending', CURRENT_TIMESTAMP)"
+        )
+    _fts_deferred = True
+    timings: dict = {}
+    started = time.monotonic()
     try:
-        conn.executescript("""
-            CREATE TABLE IF NOT EXISTS pdf_files (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT NOT NULL,
-                file_hash TEXT NOT NULL,
-                indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-
-            CREATE TABLE IF NOT EXISTS pdf_pages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                file_id INTEGER NOT NULL REFERENCES pdf_files(id) ON DELETE CASCADE,
-                page_number INTEGER NOT NULL,
-                content TEXT NOT NULL
-            );
-
-            CREATE VIRTUAL TABLE IF NOT EXISTS pdf_pages_fts USING fts5(
-                content,
-                content_rowid='id'
-            );
-        """)
-        conn.commit()
+        yield timings
     finally:
-        conn.close()
+        timings["load_seconds"] = round(time.monotonic() - started, 1)
+        started = time.monotonic()
+        with _index().writer() as conn:
+            _fts_deferred = False
+            _rebuild_fts(conn)
+        timings["fts_seconds"] = round(time.monotonic() - started, 1)
+        with _index().writer() as conn:
+            for pragma, value in saved.items():
+                conn.execute(f"PRAGMA {pragma} = {value}")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        logger.info(
+            "Bulk load: pages stored in %.1fs, full-text index built in %.1fs",
+            timings["load_seconds"],
+            timings["fts_seconds"],
+        )
 
 
-def file_already_indexed(filename: str, file_hash: str) -> bool:
-    conn = _get_conn()
-    try:
+def _rebuild_fts(conn: sqlite3.Connection) -> None:
+    conn.execute("INSERT INTO pdf_pages_fts (pdf_pages_fts) VALUES ('rebuild')")
+    conn.execute("DELETE FROM index_state WHERE key = 'fts_rebuild_pending'")
+
+
+def abort_rebuild() -> None:
+    """Discard a rebuild that did not finish; the current index stays."""
+    global _staging
+    staging, _staging = _staging, None
+    if staging is not None:
+        staging.close()
+        _drop_generation_async(staging.path)
+
+
+def _drop_generation_async(path: Path) -> None:
+    # Unlinking a multi-gigabyte file can take a while on some filesystems.
+    threading.Thread(
+        target=_drop_generation, args=(path,), name="drop-generation", daemon=True
+    ).start()
+
+
+def _drop_generation(path: Path) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            path.with_name(path.name + suffix).unlink(missing_ok=True)
+        except OSError as e:
+            logger.warning("Could not remove %s%s: %s", path.name, suffix, e)
+            return
+    logger.info("Dropped old index generation %s", path.name)
+
+
+def _in_directory(directory: str) -> tuple[str, tuple]:
+    """SQL condition on pdf_files for files at or below ``directory`` ('' = all).
+
+    Filenames are relative to /data; the subtree test is a range scan on
+    the directory index ('0' is the character after '/').
+    """
+    if not directory:
+        return "1", ()
+    return (
+        "(pdf_files.directory = ? OR "
+        "(pdf_files.directory >= ? AND pdf_files.directory < ?))",
+        (directory, directory + "/", directory + "0"),
+    )
+
+
+def get_indexed_files(directory: str = "") -> dict[str, FileRecord]:
+    """Return filename -> hash, stat and last verification of files in a subtree."""
+    where, params = _in_directory(directory)
+    return _file_records(f"WHERE {where}", params)
+
+
+def get_file_records(filenames: list[str]) -> dict[str, FileRecord]:
+    """Like get_indexed_files(), for just the given filenames."""
+    records: dict[str, FileRecord] = {}
+    # Batches stay well below SQLite's bound-parameter limit.
+    for i in range(0, len(filenames), 500):
+        batch = filenames[i : i + 500]
+        records.update(
+            _file_records(
+                f"WHERE filename IN ({', '.join('?' * len(batch))})", tuple(batch)
+            )
+        )
+    return records
+
+
+def _file_records(where: str, params: tuple) -> dict[str, FileRecord]:
+    with _index().reader() as conn:
+        rows = conn.execute(
+            f"""SELECT filename, file_hash, size, mtime_ns, inode,
+                       CAST(strftime('%s', verified_at) AS INTEGER) AS verified_at
+                FROM pdf_files {where}""",
+            params,
+        ).fetchall()
+        return {
+            r["filename"]: FileRecord(
+                r["file_hash"],
+                FileStat(r["size"], r["mtime_ns"], r["inode"])
+                if r["size"] is not None
+                else None,
+                r["verified_at"],
+            )
+            for r in rows
+        }
+
+
+def mark_file_verified(filename: str, stat: FileStat, file_hash: str) -> None:
+    """Record that ``filename`` is unchanged at ``stat``.
+
+    ``file_hash`` may be the same content hashed with another algorithm.
+    """
+    with _index().writer() as conn:
+        conn.execute(
+            """UPDATE pdf_files
+               SET file_hash = ?, size = ?, mtime_ns = ?, inode = ?,
+                   verified_at = CURRENT_TIMESTAMP
+               WHERE filename = ?""",
+            (file_hash, *stat, filename),
+        )
+        _rehash_document(conn, filename, file_hash)
+
+
+def _rehash_document(conn: sqlite3.Connection, filename: str, file_hash: str) -> None:
+    """Key the document of ``filename`` by ``file_hash`` as well.
+
+    After a HASH_ALGORITHM change a verified or moved file carries its hash
+    in the new algorithm; its document must too, or find_document() misses
+    it and copies get extracted again. If the content was meanwhile stored
+    under the new hash, the files move over to that document.
+    """
+    row = conn.execute(
+        "SELECT document_id FROM pdf_files WHERE filename = ?", (filename,)
+    ).fetchone()
+    if row is None:
+        return
+    document_id = row["document_id"]
+    other = conn.execute(
+        "SELECT id FROM pdf_documents WHERE file_hash = ?", (file_hash,)
+    ).fetchone()
+    if other is None:
+        conn.execute(
+            "UPDATE pdf_documents SET file_hash = ? WHERE id = ?",
+            (file_hash, document_id),
+        )
+    elif other["id"] != document_id:
+        conn.execute(
+            "UPDATE pdf_files SET document_id = ? WHERE document_id = ?",
+            (other["id"], document_id),
+        )
+        _delete_document(conn, document_id)
+
+
+def find_document(file_hash: str) -> int | None:
+    """Return the id of the document already indexed with this content, if any."""
+    with _index().reader() as conn:
         row = conn.execute(
-            "SELECT id FROM pdf_files WHERE filename = ? AND file_hash = ?",
-            (filename, file_hash),
+            "SELECT id FROM pdf_documents WHERE file_hash = ?", (file_hash,)
         ).fetchone()
-        return row is not None
-    finally:
-        conn.close()
+        return row["id"] if row is not None else None
 
 
-def store_file(filename: str, file_hash: str) -> int:
-    conn = _get_conn()
-    try:
-        cursor = conn.execute(
-            "INSERT INTO pdf_files (filename, file_hash) VALUES (?, ?)",
-            (filename, file_hash),
+def link_file(filename: str, file_hash: str, stat: FileStat, document_id: int) -> bool:
+    """Index ``filename`` as one more copy of an already indexed document.
+
+    Returns False if the document is gone (its last copy was replaced
+    meanwhile), in which case the file has to be extracted after all; any
+    previous version of ``filename`` then stays until that is done.
+    """
+    with _index().writer() as conn:
+        if conn.execute(
+            "SELECT 1 FROM pdf_documents WHERE id = ?", (document_id,)
+        ).fetchone() is None:
+            return False
+        _delete_file(conn, filename, keep_document=document_id)
+        _insert_file(conn, filename, file_hash, stat, document_id)
+        return True
+
+
+def move_file(old_filename: str, filename: str, stat: FileStat, file_hash: str) -> None:
+    """Re-point an indexed file at the path it was moved to; pages stay as they are."""
+    with _index().writer() as conn:
+        _delete_file(conn, filename)
+        conn.execute(
+            """UPDATE pdf_files
+               SET filename = ?, directory = ?, file_hash = ?,
+                   size = ?, mtime_ns = ?, inode = ?, verified_at = CURRENT_TIMESTAMP
+               WHERE filename = ?""",
+            (filename, posixpath.dirname(filename), file_hash, *stat, old_filename),
         )
-        conn.commit()
-        return cursor.lastrowid
-    finally:
-        conn.close()
+        _rehash_document(conn, filename, file_hash)
 
 
-def store_page(file_id: int, page_number: int, content: str) -> None:
-    conn = _get_conn()
-    try:
-        cursor = conn.execute(
-            "INSERT INTO pdf_pages (file_id, page_number, content) VALUES (?, ?, ?)",
-            (file_id, page_number, content),
+def store_document(
+    filename: str, file_hash: str, pages: list[Page], stat: FileStat
+) -> int:
+    """Store a file with its document's pages and FTS entries in one transaction.
+
+    Any previous version of the file and its checkpoint are removed in the
+    same transaction, so readers see either the old or the complete new
+    document, never a partial one. Returns the document id.
+    """
+    with _index().writer() as conn:
+        _delete_file(conn, filename)
+        row = conn.execute(
+            "SELECT id FROM pdf_documents WHERE file_hash = ?", (file_hash,)
+        ).fetchone()
+        if row is not None:
+            document_id = row["id"]  # another copy was stored meanwhile
+        else:
+            document_id = conn.execute(
+                "INSERT INTO pdf_documents (file_hash) VALUES (?)", (file_hash,)
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO pdf_pages "
+                "(document_id, page_number, content, method, reason) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(document_id, *page) for page in pages],
+            )
+            if not _fts_deferred:
+                conn.execute(
+                    "INSERT INTO pdf_pages_fts (rowid, content) "
+                    "SELECT id, content FROM pdf_pages WHERE document_id = ?",
+                    (document_id,),
+                )
+        _insert_file(conn, filename, file_hash, stat, document_id)
+        conn.execute(
+            "DELETE FROM index_checkpoints WHERE file_hash = ?", (file_hash,)
+        )
+        return document_id
+
+
+def _insert_file(
+    conn: sqlite3.Connection,
+    filename: str,
+    file_hash: str,
+    stat: FileStat,
+    document_id: int,
+) -> None:
+    conn.execute(
+        """INSERT INTO pdf_files
+             (filename, directory, file_hash, size, mtime_ns, inode, verified_at,
+              document_id)
+           VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?)""",
+        (filename, posixpath.dirname(filename), file_hash, *stat, document_id),
+    )
+
+
+def save_checkpoint(
+    filename: str, file_hash: str, last_page: int, pages: list[Page]
+) -> None:
+    """Persist pages extracted so far for a file that is not finished yet."""
+    with _index().writer() as conn:
+        # A checkpoint for an older version of the same file is useless now.
+        conn.execute(
+            "DELETE FROM index_checkpoints WHERE filename = ? AND file_hash != ?",
+            (filename, file_hash),
         )
-        page_id = cursor.lastrowid
         conn.execute(
-            "INSERT INTO pdf_pages_fts (rowid, content) VALUES (?, ?)",
-            (page_id, content),
+            """INSERT INTO index_checkpoints (file_hash, filename, last_page)
+               VALUES (?, ?, ?)
+               ON CONFLICT(file_hash) DO UPDATE SET
+                 filename = excluded.filename,
+                 last_page = excluded.last_page,
+                 updated_at = CURRENT_TIMESTAMP""",
+            (file_hash, filename, last_page),
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO checkpoint_pages "
+            "(file_hash, page_number, content, method, reason) VALUES (?, ?, ?, ?, ?)",
+            [(file_hash, *page) for page in pages],
         )
-        conn.commit()
-    finally:
-        conn.close()
 
 
-def search(query: str, limit: int = 100) -> list[dict]:
-    conn = _get_conn()
-    try:
+def load_checkpoint(file_hash: str) -> tuple[int, list[Page]]:
+    """Return the last completed page and the pages stored so far (0, [] if none)."""
+    with _index().reader() as conn:
+        row = conn.execute(
+            "SELECT last_page FROM index_checkpoints WHERE file_hash = ?",
+            (file_hash,),
+        ).fetchone()
+        if row is None:
+            return 0, []
+        rows = conn.execute(
+            "SELECT page_number, content, method, reason FROM checkpoint_pages "
+            "WHERE file_hash = ? ORDER BY page_number",
+            (file_hash,),
+        ).fetchall()
+        return row["last_page"], [Page(*r) for r in rows]
+
+
+def search(query: str, directory: str = "", limit: int = 100) -> list[dict]:
+    """Return matching pages of files below ``directory``.
+
+    ``files`` lists every path below ``directory`` with the hit's content;
+    paths are relative to ``directory``.
+    """
+    where, params = _in_directory(directory)
+    with _db.reader() as conn:
         rows = conn.execute(
-            """
+            f"""
             SELECT
-                pf.filename,
+                pp.document_id,
                 pp.page_number,
                 snippet(pdf_pages_fts, 0, '<mark>', '</mark>', '…', 40) AS snippet
             FROM pdf_pages_fts
             JOIN pdf_pages pp ON pp.id = pdf_pages_fts.rowid
-            JOIN pdf_files pf ON pf.id = pp.file_id
             WHERE pdf_pages_fts MATCH ?
+              AND EXISTS (
+                SELECT 1 FROM pdf_files
+                WHERE pdf_files.document_id = pp.document_id AND {where}
+              )
             ORDER BY rank
             LIMIT ?
             """,
-            (query, limit),
+            (query, *params, limit),
         ).fetchall()
+        document_ids = list({r["document_id"] for r in rows})
+        files: dict[int, list[str]] = {}
+        for r in conn.execute(
+            f"""SELECT document_id, filename FROM pdf_files
+                WHERE document_id IN ({", ".join("?" * len(document_ids))})
+                  AND {where}
+                ORDER BY filename""",
+            (*document_ids, *params),
+        ):
+            filename = r["filename"]
+            if directory:
+                filename = filename[len(directory) + 1 :]
+            files.setdefault(r["document_id"], []).append(filename)
         return [
-            {"file": r["filename"], "page": r["page_number"], "snippet": r["snippet"]}
+            {
+                "file": files[r["document_id"]][0],
+                "files": files[r["document_id"]],
+                "page": r["page_number"],
+                "snippet": r["snippet"],
+            }
             for r in rows
+            if r["document_id"] in files
         ]
-    finally:
-        conn.close()
 
 
 def delete_file_by_name(filename: str) -> None:
     """Delete a file and its pages (including FTS entries) from the index."""
-    conn = _get_conn()
-    try:
-        row = conn.execute(
-            "SELECT id FROM pdf_files WHERE filename = ?", (filename,)
-        ).fetchone()
-        if row is None:
-            return
-        file_id = row["id"]
+    with _index().writer() as conn:
+        _delete_file(conn, filename)
+        conn.execute("DELETE FROM index_checkpoints WHERE filename = ?", (filename,))
+
+
+def _delete_file(
+    conn: sqlite3.Connection, filename: str, keep_document: int | None = None
+) -> None:
+    """Remove a path; its document goes too once no other path refers to it."""
+    row = conn.execute(
+        "SELECT id, document_id FROM pdf_files WHERE filename = ?", (filename,)
+    ).fetchone()
+    if row is None:
+        return
+    conn.execute("DELETE FROM pdf_files WHERE id = ?", (row["id"],))
+    document_id = row["document_id"]
+    if document_id == keep_document or conn.execute(
+        "SELECT 1 FROM pdf_files WHERE document_id = ? LIMIT 1", (document_id,)
+    ).fetchone():
+        return
+    _delete_document(conn, document_id)
+
+
+def _delete_document(conn: sqlite3.Connection, document_id: int) -> None:
+    if not _fts_deferred:
+        # Only entries that were inserted may be deleted from external-content FTS.
         conn.execute(
             "DELETE FROM pdf_pages_fts WHERE rowid IN "
-            "(SELECT id FROM pdf_pages WHERE file_id = ?)",
-            (file_id,),
+            "(SELECT id FROM pdf_pages WHERE document_id = ?)",
+            (document_id,),
         )
-        conn.execute("DELETE FROM pdf_pages WHERE file_id = ?", (file_id,))
-        conn.execute("DELETE FROM pdf_files WHERE id = ?", (file_id,))
-        conn.commit()
-    finally:
-        conn.close()
-
-
-def clear_index() -> None:
-    conn = _get_conn()
-    try:
-        conn.executescript("""
-            DELETE FROM pdf_pages_fts;
-            DELETE FROM pdf_pages;
-            DELETE FROM pdf_files;
-        """)
-        conn.commit()
-    finally:
-        conn.close()
+    conn.execute("DELETE FROM pdf_pages WHERE document_id = ?", (document_id,))
+    conn.execute("DELETE FROM pdf_documents WHERE id = ?", (document_id,))
 
 
 def get_indexed_count() -> int:
-    conn = _get_conn()
-    try:
+    with _index().reader() as conn:
         row = conn.execute("SELECT COUNT(*) AS cnt FROM pdf_files").fetchone()
         return row["cnt"]
-    finally:
-        conn.close()
 
 
-def get_indexed_filenames() -> set[str]:
-    conn = _get_conn()
-    try:
-        rows = conn.execute("SELECT filename FROM pdf_files").fetchall()
+def get_indexed_filenames(directory: str = "") -> set[str]:
+    where, params = _in_directory(directory)
+    with _db.reader() as conn:
+        rows = conn.execute(
+            f"SELECT filename FROM pdf_files WHERE {where}", params
+        ).fetchall()
         return {r["filename"] for r in rows}
-    finally:
-        conn.close()
 
 
-def get_stats() -> dict:
-    conn = _get_conn()
-    try:
+def add_index_root(directory: str) -> None:
+    """Remember that the subtree ``directory`` ('' = all of /data) is indexed."""
+    with _index().writer() as conn:
+        conn.execute(
+            """INSERT INTO index_roots (path) VALUES (?)
+               ON CONFLICT(path) DO UPDATE SET indexed_at = CURRENT_TIMESTAMP""",
+            (directory,),
+        )
+
+
+def get_index_roots() -> list[str]:
+    with _db.reader() as conn:
+        rows = conn.execute("SELECT path FROM index_roots ORDER BY path").fetchall()
+        return [r["path"] for r in rows]
+
+
+def is_under_root(path: str, roots: list[str]) -> bool:
+    """Whether ``path`` (relative to /data) lies in one of the indexed ``roots``."""
+    return any(
+        root == "" or path == root or path.startswith(root + "/") for root in roots
+    )
+
+
+def get_stats(directory: str = "") -> dict:
+    """Index statistics for files below ``directory`` ('' = everything)."""
+    where, params = _in_directory(directory)
+    # Pages belong to documents; count those with a file in scope.
+    pages_where = (
+        f"WHERE document_id IN (SELECT document_id FROM pdf_files WHERE {where})"
+        if directory
+        else ""
+    )
+    # files_by_directory groups by the first path component below the scope.
+    start = len(directory) + 2 if directory else 1
+    with _db.reader() as conn:
         file_count = conn.execute(
-            "SELECT COUNT(*) AS cnt FROM pdf_files"
+            f"SELECT COUNT(*) AS cnt FROM pdf_files WHERE {where}", params
+        ).fetchone()["cnt"]
+
+        document_count = conn.execute(
+            f"SELECT COUNT(DISTINCT document_id) AS cnt FROM pdf_files WHERE {where}",
+            params,
         ).fetchone()["cnt"]
 
         page_count = conn.execute(
-            "SELECT COUNT(*) AS cnt FROM pdf_pages"
+            f"SELECT COUNT(*) AS cnt FROM pdf_pages {pages_where}", params
         ).fetchone()["cnt"]
 
         total_chars = conn.execute(
-            "SELECT COALESCE(SUM(LENGTH(content)), 0) AS total FROM pdf_pages"
+            "SELECT COALESCE(SUM(LENGTH(content)), 0) AS total "
+            f"FROM pdf_pages {pages_where}",
+            params,
         ).fetchone()["total"]
 
         avg_pages = conn.execute(
-            """SELECT COALESCE(ROUND(AVG(pc), 1), 0) AS avg_pages
-               FROM (SELECT COUNT(*) AS pc FROM pdf_pages GROUP BY file_id)"""
+            f"""SELECT COALESCE(ROUND(AVG(pc), 1), 0) AS avg_pages
+                FROM (SELECT COUNT(*) AS pc FROM pdf_pages {pages_where}
+                      GROUP BY document_id)""",
+            params,
         ).fetchone()["avg_pages"]
 
         dirs_rows = conn.execute(
-            """SELECT
-                 CASE
-                   WHEN INSTR(filename, '/') > 0
-                   THEN SUBSTR(filename, 1, INSTR(filename, '/') - 1)
-                   ELSE '.'
-                 END AS dir,
-                 COUNT(*) AS cnt
-               FROM pdf_files
-               GROUP BY dir
-               ORDER BY cnt DESC"""
+            f"""SELECT
+                  CASE
+                    WHEN INSTR(rel, '/') > 0
+                    THEN SUBSTR(rel, 1, INSTR(rel, '/') - 1)
+                    ELSE '.'
+                  END AS dir,
+                  COUNT(*) AS cnt
+                FROM (SELECT SUBSTR(filename, ?) AS rel FROM pdf_files WHERE {where})
+                GROUP BY dir
+                ORDER BY cnt DESC""",
+            (start, *params),
         ).fetchall()
         files_by_dir = {r["dir"]: r["cnt"] for r in dirs_rows}
 
+        # method/reason are NULL for pages indexed before the classifier.
+        method_rows = conn.execute(
+            f"""SELECT COALESCE(method, 'unknown') AS method,
+                       COALESCE(reason, 'unknown') AS reason,
+                       COUNT(*) AS cnt
+                FROM pdf_pages {pages_where}
+                GROUP BY method, reason
+                ORDER BY method, cnt DESC""",
+            params,
+        ).fetchall()
+        pages_by_method: dict[str, dict[str, int]] = {}
+        for r in method_rows:
+            pages_by_method.setdefault(r["method"], {})[r["reason"]] = r["cnt"]
+
         return {
+            "db_size_bytes": db_size(conn),
             "files": file_count,
+            "documents": document_count,
             "pages": page_count,
             "total_chars": total_chars,
             "avg_pages_per_file": float(avg_pages),
             "files_by_directory": files_by_dir,
+            "pages_by_method": pages_by_method,
         }
-    finally:
-        conn.close()
+
+
+def close_db() -> None:
+    abort_rebuild()
+    _db.close()
@@ -0,0 +1,131 @@
+"""Named, separately sized thread pools for each kind of background work.
+
+Indexing, hashing, OCR, page rendering and database reads each get their
+own lane so that one workload cannot starve another. Sizes and queue limits
+come from the environment, e.g. ``EXECUTOR_RENDER_WORKERS=4`` or
+``EXECUTOR_OCR_QUEUE=128``.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+from app.backend.database import READER_POOL_SIZE
+
+_CPUS = os.cpu_count() or 1
+
+# name -> (default workers, default max queued tasks)
+LANES: dict[str, tuple[int, int]] = {
+    "indexing": (1, 1),
+    "hashing": (4, 16),
+    "ocr": (_CPUS, 4 * _CPUS),
+    "render": (2, 16),
+    "db": (READER_POOL_SIZE, 64),
+}
+
+
+class ExecutorBusy(RuntimeError):
+    """Raised when a lane's queue is full and the caller asked not to wait."""
+
+
+class BoundedExecutor:
+    """ThreadPoolExecutor with a cap on running plus queued tasks."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def submit(self, fn, *args, block: bool = False, **kwargs) -> Future:
+        """Schedule ``fn``; wait for a free slot if ``block``, else raise ExecutorBusy."""
+        if not self._slots.acquire(blocking=block):
+            with self._lock:
+                self._rejected += 1
+            raise ExecutorBusy(f"{self.name} executor is busy")
+        with self._lock:
+            self._queued += 1
+        try:
+            return self._executor.submit(self._call, fn, *args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+
+    def _call(self, fn, *args, **kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+            self._slots.release()
+
+    async def run(self, fn, *args, **kwargs):
+        """Run ``fn`` on this lane from async code; raises ExecutorBusy when full."""
+        return await asyncio.wrap_future(self.submit(partial(fn, *args, **kwargs)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+_executors: dict[str, BoundedExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    """Return the lane called ``name``, creating it on first use."""
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            workers, queue = LANES[name]
+            prefix = f"EXECUTOR_{name.upper()}"
+            executor = BoundedExecutor(
+                name,
+                max_workers=max(1, _env_int(f"{prefix}_WORKERS", workers)),
+                max_queue=max(0, _env_int(f"{prefix}_QUEUE", queue)),
+            )
+            _executors[name] = executor
+        return executor
+
+
+def executor_stats() -> dict[str, dict]:
+    with _executors_lock:
+        return {name: ex.stats() for name, ex in _executors.items()}
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,212 @@
+"""Text extraction backends.
+
+A backend returns, for a range of pages, the text layer plus the cheap
+signals the page classifier needs (page size, image coverage and
+resolution). ``TEXT_EXTRACTOR`` selects one per deployment:
+
+- ``poppler`` (default): one ``pdftotext`` run for the whole range, with
+  ``pdfinfo`` and ``pdfimages -list`` for page sizes and images. Much
+  faster on born-digital PDFs.
+- ``pdfplumber``: full layout analysis per page. Slower, but its reading
+  order is what earlier versions indexed, and it counts vector objects, so
+  pages with neither text nor images can be skipped without rendering.
+"""
+
+import itertools
+import os
+import re
+import subprocess
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Callable
+
+import pdfplumber
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import resolve1
+from pdfplumber.page import Page as PdfplumberPage
+
+TEXT_EXTRACTOR = os.environ.get("TEXT_EXTRACTOR", "poppler")
+# pdfminer caches every object it parses for as long as the document is
+# open, so the cache is dropped every this many pages.
+PDFPLUMBER_WINDOW_PAGES = max(1, int(os.environ.get("PDFPLUMBER_WINDOW_PAGES", "25")))
+
+
+@dataclass
+class PageInfo:
+    """Cheap per-page signals collected during text extraction."""
+
+    number: int
+    text: str
+    width: float  # points
+    height: float
+    image_coverage: float  # 0..1, share of the page area covered by images
+    image_dpi: float | None  # resolution of the largest embedded image
+    vector_objects: int | None  # curves + lines + rects, None if not known
+
+
+class TextExtractor:
+    name = ""
+
+    def extract(
+        self,
+        pdf_path: str,
+        first_page: int,
+        last_page: int,
+        report: Callable[[int, int], None] | None = None,
+    ) -> tuple[int, list[PageInfo]]:
+        """Return the document's page count and pages first..last (1-based).
+
+        ``report(page, page_count)`` is called as pages are processed.
+        """
+        raise NotImplementedError
+
+
+class PdfplumberExtractor(TextExtractor):
+    name = "pdfplumber"
+
+    def extract(self, pdf_path, first_page, last_page, report=None):
+        infos = []
+        with pdfplumber.open(pdf_path) as pdf:
+            page_count = int(resolve1(pdf.doc.catalog["Pages"])["Count"])
+            # pdf.pages (even with pages=) wraps every page of the document;
+            # walk the page tree once and stop after the range.
+            page_objs = itertools.islice(
+                PDFPage.create_pages(pdf.doc), first_page - 1, last_page
+            )
+            for number, page_obj in enumerate(page_objs, first_page):
+                if report:
+                    report(number, page_count)
+                page = PdfplumberPage(pdf, page_obj, page_number=number)
+                infos.append(self._page_info(number, page))
+                page.close()  # drop the parsed layout
+                if (number - first_page + 1) % PDFPLUMBER_WINDOW_PAGES == 0:
+                    pdf.doc._cached_objs.clear()
+                    pdf.doc._parsed_objs.clear()
+        return page_count, infos
+
+    @staticmethod
+    def _page_info(number: int, page) -> PageInfo:
+        area = page.width * page.height or 1
+        covered = 0.0
+        largest = None
+        for img in page.images:
+            w = min(img["x1"], page.width) - max(img["x0"], 0)
+            h = min(img["bottom"], page.height) - max(img["top"], 0)
+            if w > 0 and h > 0:
+                covered += w * h
+                if largest is None or w * h > largest[0]:
+                    largest = (w * h, img)
+        image_dpi = None
+        if largest is not None and largest[1]["width"] > 0:
+            img = largest[1]
+            image_dpi = img["srcsize"][0] * 72 / img["width"]
+        return PageInfo(
+            number=number,
+            text=(page.extract_text() or "").strip(),
+            width=page.width,
+            height=page.height,
+            image_coverage=min(1.0, covered / area),
+            image_dpi=image_dpi,
+            vector_objects=len(page.curves) + len(page.lines) + len(page.rects),
+        )
+
+
+_PAGES_RE = re.compile(r"^Pages:\s+(\d+)", re.MULTILINE)
+_PAGE_SIZE_RE = re.compile(
+    r"^Page\s+(\d+) size:\s+([\d.]+) x ([\d.]+) pts", re.MULTILINE
+)
+_PAGE_ROT_RE = re.compile(r"^Page\s+(\d+) rot:\s+(\d+)", re.MULTILINE)
+
+
+def _run(args: list[str]) -> str:
+    result = subprocess.run(args, capture_output=True)
+    if result.returncode != 0:
+        stderr = result.stderr.decode("utf-8", "replace").strip()
+        raise RuntimeError(f"{args[0]} failed: {stderr}")
+    return result.stdout.decode("utf-8", "replace")
+
+
+class PopplerExtractor(TextExtractor):
+    name = "poppler"
+
+    def extract(self, pdf_path, first_page, last_page, report=None):
+        page_count, sizes = self._page_sizes(pdf_path, first_page, last_page)
+        last_page = min(last_page, page_count)
+        if first_page > last_page:
+            return page_count, []
+
+        pages = ["-f", str(first_page), "-l", str(last_page)]
+        # Every page, including the last, is terminated by a form feed.
+        texts = _run(["pdftotext", *pages, "-enc", "UTF-8", pdf_path, "-"]).split("\f")
+        images = self._images(pdf_path, pages)
+
+        infos = []
+        for i in range(first_page, last_page + 1):
+            if report:
+                report(i, page_count)
+            width, height = sizes.get(i, (0.0, 0.0))
+            area = width * height or 1
+            covered = 0.0
+            image_dpi = None
+            largest = 0.0
+            for w_pt, h_pt, ppi in images[i]:
+                covered += w_pt * h_pt
+                if w_pt * h_pt > largest:
+                    largest, image_dpi = w_pt * h_pt, ppi
+            infos.append(
+                PageInfo(
+                    number=i,
+                    text=texts[i - first_page].strip(),
+                    width=width,
+                    height=height,
+                    image_coverage=min(1.0, covered / area),
+                    image_dpi=image_dpi,
+                    vector_objects=None,
+                )
+            )
+        return page_count, infos
+
+    @staticmethod
+    def _page_sizes(
+        pdf_path: str, first_page: int, last_page: int
+    ) -> tuple[int, dict[int, tuple[float, float]]]:
+        out = _run(["pdfinfo", "-f", str(first_page), "-l", str(last_page), pdf_path])
+        match = _PAGES_RE.search(out)
+        page_count = int(match.group(1)) if match else 0
+        rotated = {int(n) for n, rot in _PAGE_ROT_RE.findall(out) if int(rot) % 180}
+        sizes = {}
+        for n, w, h in _PAGE_SIZE_RE.findall(out):
+            w, h = float(w), float(h)
+            sizes[int(n)] = (h, w) if int(n) in rotated else (w, h)
+        return page_count, sizes
+
+    @staticmethod
+    def _images(
+        pdf_path: str, pages: list[str]
+    ) -> dict[int, list[tuple[float, float, float]]]:
+        """Page -> [(width pt, height pt, dpi)] for each image drawn on it."""
+        images: dict[int, list[tuple[float, float, float]]] = defaultdict(list)
+        out = _run(["pdfimages", "-list", *pages, pdf_path])
+        # page num type width height color comp bpc enc interp object ID x-ppi y-ppi size ratio
+        for line in out.splitlines()[2:]:
+            cols = line.split()
+            if len(cols) < 14 or cols[2] != "image":
+                continue
+            width_px, height_px = int(cols[3]), int(cols[4])
+            x_ppi, y_ppi = float(cols[12]), float(cols[13])
+            if x_ppi <= 0 or y_ppi <= 0:
+                continue
+            images[int(cols[0])].append(
+                (width_px / x_ppi * 72, height_px / y_ppi * 72, x_ppi)
+            )
+        return images
+
+
+EXTRACTORS: dict[str, type[TextExtractor]] = {
+    "poppler": PopplerExtractor,
+    "pdfplumber": PdfplumberExtractor,
+}
+
+
+def get_extractor() -> TextExtractor:
+    return EXTRACTORS[TEXT_EXTRACTOR]()
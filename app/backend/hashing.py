@@ -0,0 +1,61 @@
+"""Content hashes that identify indexed files.
+
+``HASH_ALGORITHM`` picks the algorithm for newly hashed files: ``sha256``
+(default), ``blake2b`` (faster on 64-bit CPUs) or ``xxh3_128`` (much
+faster, not cryptographic, needs the optional ``xxhash`` package). Stored
+hashes carry an ``algorithm:`` prefix, except SHA-256, which stays bare
+hex for compatibility with existing indexes; a file is always verified
+with the algorithm its stored hash was made with.
+
+Files are read in large chunks into a reused buffer. hashlib releases the
+GIL while hashing, so several files can be hashed in parallel threads.
+"""
+
+import hashlib
+import os
+
+try:
+    import xxhash
+except ImportError:  # optional
+    xxhash = None
+
+HASH_ALGORITHM = os.environ.get("HASH_ALGORITHM", "sha256")
+READ_CHUNK = 1024 * 1024
+
+
+def _new_hasher(algorithm: str):
+    if algorithm == "sha256":
+        return hashlib.sha256()
+    if algorithm == "blake2b":
+        return hashlib.blake2b()
+    if algorithm == "xxh3_128":
+        if xxhash is None:
+            raise RuntimeError("xxhash is not installed")
+        return xxhash.xxh3_128()
+    raise ValueError(f"Unknown hash algorithm: {algorithm}")
+
+
+def algorithm_of(file_hash: str) -> str:
+    """Return the algorithm a stored hash was made with."""
+    algorithm, sep, _ = file_hash.partition(":")
+    return algorithm if sep else "sha256"
+
+
+def _format(algorithm: str, digest: str) -> str:
+    return digest if algorithm == "sha256" else f"{algorithm}:{digest}"
+
+
+def hash_file(path: os.PathLike, *algorithms: str) -> dict[str, str]:
+    """Hash ``path`` with each of ``algorithms`` (default HASH_ALGORITHM) in one read.
+
+    Returns algorithm -> stored-format hash.
+    """
+    algorithms = algorithms or (HASH_ALGORITHM,)
+    hashers = {a: _new_hasher(a) for a in dict.fromkeys(algorithms)}
+    buffer = bytearray(READ_CHUNK)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while n := f.readinto(buffer):
+            for hasher in hashers.values():
+                hasher.update(view[:n])
+    return {a: _format(a, h.hexdigest()) for a, h in hashers.items()}
@@ -1,30 +1,84 @@
 import asyncio
-import hashlib
+import collections
+import functools
 import logging
-from dataclasses import dataclass, field
+import math
+import multiprocessing
+import os
+import queue
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field, replace
 from pathlib import Path
+from typing import Iterator
 
-from PIL import Image
-
-Image.MAX_IMAGE_PIXELS = 300_000_000  # allow large scanned pages
-
-import pdfplumber
-import pytesseract
 from pdf2image import convert_from_path
+from PIL import Image
 
+from app.backend.budget import MemoryBudget
 from app.backend.database import (
-    clear_index,
+    FileRecord,
+    FileStat,
+    Page,
+    abort_rebuild,
+    add_index_root,
+    begin_rebuild,
+    bulk_load,
     delete_file_by_name,
-    file_already_indexed,
+    find_document,
+    finish_rebuild,
+    get_file_records,
+    get_index_roots,
+    get_indexed_count,
     get_indexed_filenames,
-    store_file,
-    store_page,
+    get_indexed_files,
+    is_under_root,
+    link_file,
+    load_checkpoint,
+    mark_file_verified,
+    move_file,
+    save_checkpoint,
+    store_document,
 )
+from app.backend.executors import get_executor
+from app.backend.extract import PageInfo, get_extractor
+from app.backend.hashing import HASH_ALGORITHM, algorithm_of, hash_file
+from app.backend.ocr import OCR_LANG, OcrResult, get_engine
+from app.backend.ocr_cache import cache_ocr_pages, load_cached_ocr
 
 logger = logging.getLogger(__name__)
 
 DATA_DIR = Path("/data")
 MIN_TEXT_LENGTH = 50
+# Page classification (see _classify_page)
+SCAN_COVERAGE = 0.5  # share of the page covered by images that looks like a scan
+SCAN_HEADER_TEXT_LENGTH = 200  # text over a scan shorter than this is just a header
+VECTOR_OBJECTS_MIN = 20  # drawings with this many curves/lines may hold outlined text
+BLANK_CHECK_DPI = 20
+BLANK_INK_RATIO = 0.002  # below this share of dark pixels a render counts as blank
+# Large files are split into page ranges extracted concurrently by different
+# workers; progress is checkpointed as the in-order prefix of ranges grows.
+RANGE_PAGES = 100
+# OCR rasterization profile. Scans are rendered at their native resolution
+# within OCR_MIN_DPI..OCR_MAX_DPI, capped at OCR_MAX_MEGAPIXELS per page.
+OCR_MIN_DPI = 150
+OCR_MAX_DPI = 300
+OCR_MAX_MEGAPIXELS = float(os.environ.get("OCR_MAX_MEGAPIXELS", "40"))
+OCR_GRAYSCALE = os.environ.get("OCR_GRAYSCALE", "1") == "1"
+# Pages recognised below this confidence are retried at OCR_MAX_DPI (0 = off).
+OCR_RETRY_CONFIDENCE = float(os.environ.get("OCR_RETRY_CONFIDENCE", "60"))
+OCR_BATCH_PAGES = 8  # pages rendered per pdftoppm pass
+# Upper bound on page bitmaps being rendered/OCR'd at once, across all workers.
+OCR_MEMORY_BUDGET_MB = int(os.environ.get("OCR_MEMORY_BUDGET_MB", "2048"))
+INDEX_WORKERS = max(1, int(os.environ.get("INDEX_WORKERS", os.cpu_count() or 1)))
+RECENT_FILES = 20
+# Files whose size, mtime and inode match the index are trusted without
+# hashing; every this many days they are re-hashed anyway (0 = never).
+VERIFY_INTERVAL_DAYS = float(os.environ.get("VERIFY_INTERVAL_DAYS", "0"))
 
 _current_dir: Path = DATA_DIR
 
@@ -57,96 +111,777 @@ class IndexingStatus:
     processed_files: int = 0
     current_file: str = ""
     errors: list[str] = field(default_factory=list)
+    # worker pid -> {"file": ..., "page": ..., "pages": ...}
+    workers: dict[int, dict] = field(default_factory=dict)
+    # last RECENT_FILES indexed files: {"file", "pages", "seconds", "peak_rss_mb"}
+    recent_files: list[dict] = field(default_factory=list)
+    # timings of the last bulk load: {"load_seconds", "fts_seconds"}
+    bulk_load: dict | None = None
+    # outcome of the last full rebuild: "running", "swapped" or "discarded"
+    rebuild: str | None = None
 
 
 status = IndexingStatus()
 _lock = asyncio.Lock()
 
 
-def _sha256(path: Path) -> str:
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
-    return h.hexdigest()
+def _classify_page(info: PageInfo) -> tuple[str, str]:
+    """Decide between "text", "ocr" and "skip" for a page, with a reason.
+
+    Pages whose decision is ("ocr", "no_text_layer") still get a blank check
+    on a low-resolution render before OCR. Without a vector object count
+    (poppler backend) pages with no text and no images take that route too.
+    """
+    length = len(info.text)
+    scanned = info.image_coverage >= SCAN_COVERAGE
+    if length >= MIN_TEXT_LENGTH:
+        if scanned and length < SCAN_HEADER_TEXT_LENGTH:
+            return "ocr", "text_header_over_scan"
+        return "text", "text_layer"
+    if length > 0:
+        if scanned:
+            return "ocr", "little_text_over_scan"
+        return "text", "short_text"
+    if (
+        info.image_coverage == 0
+        and info.vector_objects is not None
+        and info.vector_objects < VECTOR_OBJECTS_MIN
+    ):
+        return "skip", "empty_page"
+    return "ocr", "no_text_layer"
+
+
+def _is_blank(thumbnail: Image.Image) -> bool:
+    histogram = thumbnail.convert("L").histogram()
+    dark = sum(histogram[:160])
+    return dark / (thumbnail.width * thumbnail.height) < BLANK_INK_RATIO
+
+
+def _blank_pages(pdf_path: Path, page_numbers: list[int]) -> list[int]:
+    """Return the pages that render (at BLANK_CHECK_DPI) as blank paper."""
+    blank = []
+    for first, last in _contiguous_runs(page_numbers):
+        thumbnails = convert_from_path(
+            str(pdf_path),
+            first_page=first,
+            last_page=last,
+            dpi=BLANK_CHECK_DPI,
+            grayscale=True,
+        )
+        for i, thumbnail in zip(range(first, last + 1), thumbnails):
+            if _is_blank(thumbnail):
+                blank.append(i)
+    return blank
+
+
+def _contiguous_runs(page_numbers: list[int]) -> list[tuple[int, int]]:
+    """Group sorted page numbers into (first, last) runs of consecutive pages."""
+    runs: list[tuple[int, int]] = []
+    for n in page_numbers:
+        if runs and runs[-1][1] == n - 1:
+            runs[-1] = (runs[-1][0], n)
+        else:
+            runs.append((n, n))
+    return runs
 
 
-def _extract_text_pdfplumber(page) -> str:
-    text = page.extract_text() or ""
-    return text.strip()
+@dataclass
+class OcrPage:
+    number: int
+    reason: str  # classifier reason, stored with the page
+    width: float  # points
+    height: float
+    dpi: int
+
+
+def _pixel_capped_dpi(width_pt: float, height_pt: float) -> int:
+    """Highest DPI at which the page stays within OCR_MAX_MEGAPIXELS."""
+    return int(72 * math.sqrt(OCR_MAX_MEGAPIXELS * 1e6 / (width_pt * height_pt or 1)))
+
+
+def _ocr_dpi(info: PageInfo) -> int:
+    """Pick the OCR resolution for a page.
+
+    Rendering a 200 dpi scan at 300 dpi adds pixels but no detail, so scans
+    use their embedded image resolution; pages without images (outlined
+    text, drawings) get OCR_MAX_DPI. Large formats are scaled down to the
+    pixel cap.
+    """
+    dpi = OCR_MAX_DPI
+    if info.image_dpi:
+        dpi = max(OCR_MIN_DPI, min(OCR_MAX_DPI, round(info.image_dpi)))
+    return min(dpi, _pixel_capped_dpi(info.width, info.height))
+
+
+def _bitmap_bytes(page: OcrPage) -> int:
+    """Estimated size of a page rendered for OCR."""
+    channels = 1 if OCR_GRAYSCALE else 3
+    return int(page.width / 72 * page.dpi) * int(page.height / 72 * page.dpi) * channels
+
+
+def _ocr_batches(pages: list[OcrPage]) -> Iterator[list[OcrPage]]:
+    """Group pages into runs of consecutive, same-DPI pages (OCR_BATCH_PAGES max)."""
+    batch: list[OcrPage] = []
+    for page in sorted(pages, key=lambda p: p.number):
+        if batch and (
+            page.number != batch[-1].number + 1
+            or page.dpi != batch[0].dpi
+            or len(batch) == OCR_BATCH_PAGES
+        ):
+            yield batch
+            batch = []
+        batch.append(page)
+    if batch:
+        yield batch
+
+
+def _ocr_image_file(image_path: str) -> OcrResult:
+    try:
+        return get_engine(_ocr_engine).recognize(image_path)
+    finally:
+        os.unlink(image_path)
+
+
+def _ocr_pass(pdf_path: Path, pages: list[OcrPage], report) -> dict[int, OcrResult]:
+    """Rasterize and OCR the given pages.
+
+    Consecutive pages are rendered by one pdftoppm pass (split over as many
+    processes as there are OCR threads) straight into a temp directory, and
+    Tesseract reads the files from there, so full-resolution bitmaps never
+    sit in this process's memory. Each batch reserves its estimated bitmap
+    size from the shared memory budget before rendering.
+    """
+    ocr = get_executor("ocr")
+    pending: list[tuple[int, Future]] = []
+    with tempfile.TemporaryDirectory(prefix="pdf_search_ocr_") as tmp:
+        for batch in _ocr_batches(pages):
+            cost = sum(_bitmap_bytes(page) for page in batch)
+            reserved = _memory_budget.acquire(cost) if _memory_budget else 0
+            try:
+                paths = convert_from_path(
+                    str(pdf_path),
+                    first_page=batch[0].number,
+                    last_page=batch[-1].number,
+                    dpi=batch[0].dpi,
+                    grayscale=OCR_GRAYSCALE,
+                    thread_count=min(ocr.max_workers, len(batch)),
+                    output_folder=tmp,
+                    paths_only=True,
+                )
+                if len(paths) != len(batch):
+                    raise RuntimeError(
+                        f"pdftoppm rendered {len(paths)} of {len(batch)} pages "
+                        f"{batch[0].number}-{batch[-1].number} for OCR"
+                    )
+            except BaseException:
+                if _memory_budget:
+                    _memory_budget.release(reserved)
+                raise
+            futures = []
+            for page, image_path in zip(batch, paths, strict=True):
+                report(page.number)
+                futures.append(ocr.submit(_ocr_image_file, image_path, block=True))
+                pending.append((page.number, futures[-1]))
+            if _memory_budget:
+                _memory_budget.release_when_done(futures, reserved)
+        # The images live in tmp, so wait for OCR before it is removed.
+        return {number: future.result() for number, future in pending}
+
+
+def _ocr_pages(pdf_path: Path, pages: list[OcrPage], report) -> dict[int, OcrResult]:
+    """OCR pages at their chosen DPI, retrying low-confidence ones at a higher DPI."""
+    results = _ocr_pass(pdf_path, pages, report)
+    if not OCR_RETRY_CONFIDENCE:
+        return results
+
+    retry = []
+    for page in pages:
+        confidence = results[page.number].confidence
+        retry_dpi = min(OCR_MAX_DPI, _pixel_capped_dpi(page.width, page.height))
+        if confidence is not None and confidence < OCR_RETRY_CONFIDENCE:
+            if page.dpi < retry_dpi:
+                retry.append(replace(page, dpi=retry_dpi))
+    for number, result in _ocr_pass(pdf_path, retry, report).items():
+        if result.confidence > results[number].confidence:
+            results[number] = result
+    return results
+
+
+# --- Worker processes -------------------------------------------------------
+#
+# Text extraction and OCR run in a pool of worker processes (pdfplumber is
+# GIL-bound, so threads would not help; poppler's tools are external
+# processes anyway). Workers never touch the database:
+# they return extracted pages to the indexing thread, which is the single
+# writer. Progress is reported back through a multiprocessing queue.
+
+_progress_queue = None
+_memory_budget: MemoryBudget | None = None
+_ocr_engine = "auto"  # resolved by the parent, so every worker uses the same one
+
+
+def _init_worker(
+    progress_queue, memory_budget: MemoryBudget, ocr_threads: int, ocr_engine: str
+) -> None:
+    global _progress_queue, _memory_budget, _ocr_engine
+    _progress_queue = progress_queue
+    _memory_budget = memory_budget
+    _ocr_engine = ocr_engine
+    os.environ.setdefault("EXECUTOR_OCR_WORKERS", str(ocr_threads))
+    # Queued OCR tasks hold rendered pages in the temp dir; keep it short.
+    os.environ.setdefault("EXECUTOR_OCR_QUEUE", str(ocr_threads))
+
+
+def _report_progress(rel_path: str, page: int, page_count: int) -> None:
+    if _progress_queue is not None:
+        _progress_queue.put_nowait((os.getpid(), rel_path, page, page_count))
+
+
+def _reset_peak_rss() -> None:
+    """Restart this process's VmHWM from its current RSS (Linux only)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
 
 
-def _ocr_page_image(pdf_path: Path, page_number: int) -> str:
-    images = convert_from_path(
-        str(pdf_path), first_page=page_number, last_page=page_number, dpi=300
+def _peak_rss() -> int:
+    """Peak resident set size of this process in bytes, since the last reset."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _extract_range(
+    pdf_path: str,
+    rel_path: str,
+    first_page: int,
+    last_page: int,
+    cached_ocr: dict[int, str],
+) -> tuple[int, list[Page], int]:
+    """Extract pages first_page..last_page (1-based, inclusive).
+
+    Pages found in ``cached_ocr`` (page -> text) are not OCR'd again.
+    Returns the document's page count, the classified pages and the peak
+    RSS of the worker while it processed the range.
+    """
+    _reset_peak_rss()
+    pages: list[Page] = []
+    to_ocr: dict[int, OcrPage] = {}
+    page_count, infos = get_extractor().extract(
+        pdf_path,
+        first_page,
+        last_page,
+        lambda i, count: _report_progress(rel_path, i, count),
     )
-    if not images:
-        return ""
-    return pytesseract.image_to_string(images[0], lang="pol").strip()
+    for info in infos:
+        i = info.number
+        method, reason = _classify_page(info)
+        if method == "ocr" and i in cached_ocr:
+            pages.append(Page(i, cached_ocr[i], method, reason))
+        elif method == "ocr":
+            to_ocr[i] = OcrPage(i, reason, info.width, info.height, _ocr_dpi(info))
+        else:
+            pages.append(Page(i, info.text if method == "text" else "", method, reason))
+
+    # A cheap low-resolution look at pages with no text layer at all weeds
+    # out blank scans before paying for a full render and OCR.
+    no_text = [i for i, p in to_ocr.items() if p.reason == "no_text_layer"]
+    for i in _blank_pages(Path(pdf_path), no_text):
+        del to_ocr[i]
+        pages.append(Page(i, "", "skip", "blank_render"))
+
+    if to_ocr:
+        results = _ocr_pages(
+            Path(pdf_path),
+            list(to_ocr.values()),
+            lambda i: _report_progress(rel_path, i, page_count),
+        )
+        pages.extend(
+            Page(i, result.text, "ocr", to_ocr[i].reason)
+            for i, result in results.items()
+        )
+    pages.sort()
+    return page_count, pages, _peak_rss()
+
+
+# --- Single writer ----------------------------------------------------------
 
 
-def _index_single_file(pdf_path: Path) -> None:
-    rel_path = str(pdf_path.relative_to(_current_dir))
-    file_hash = _sha256(pdf_path)
+@dataclass
+class _FileJob:
+    path: Path
+    rel_path: str
+    file_hash: str
+    stat: FileStat
+    pages: list[Page]  # pages 1..done_through, in order
+    done_through: int  # last page of the contiguous finished prefix
+    page_count: int | None = None  # known once the first range returns
+    outstanding: int = 0  # ranges submitted but not finished
+    failed: bool = False
+    peak_rss: int = 0  # highest worker RSS seen while extracting any range
+    started: float = field(default_factory=time.monotonic)
+    # Ranges that finished ahead of an earlier one: first page -> (last, pages)
+    finished: dict[int, tuple[int, list[Page]]] = field(
+        default_factory=dict
+    )
+    # Other paths with the same content found during this run: (path, stat)
+    copies: list[tuple[str, FileStat]] = field(default_factory=list)
+    cached_ocr: dict[int, str] = field(default_factory=dict)  # page -> OCR text
+
+
+@functools.cache
+def _ocr_profile() -> str:
+    """Everything that changes OCR output; part of the OCR cache key.
+
+    Names the engine that actually runs (OCR_ENGINE=auto may fall back to
+    pytesseract); workers are started with that same engine.
+    """
+    return (
+        f"{get_engine().name}:{OCR_LANG}:{OCR_MIN_DPI}-{OCR_MAX_DPI}dpi:"
+        f"{OCR_MAX_MEGAPIXELS}mp:{'gray' if OCR_GRAYSCALE else 'rgb'}:"
+        f"retry{OCR_RETRY_CONFIDENCE}"
+    )
 
-    if file_already_indexed(rel_path, file_hash):
-        logger.info("Skipping (unchanged): %s", rel_path)
-        return
 
-    # Remove old entry if file was modified (different hash)
-    delete_file_by_name(rel_path)
+def _verify_due(record: FileRecord) -> bool:
+    if VERIFY_INTERVAL_DAYS <= 0:
+        return False
+    if record.verified_at is None:
+        return True
+    return time.time() - record.verified_at >= VERIFY_INTERVAL_DAYS * 86400
+
+
+class _VanishedFiles:
+    """Indexed files that are gone from disk, claimable by a moved copy.
+
+    A new path whose content hash matches a vanished file is that file
+    after a move or rename; its row is re-pointed instead of re-extracted.
+    Whatever is left unclaimed at the end of the run is really deleted.
+    """
+
+    def __init__(self, indexed: dict[str, FileRecord], names: set[str]) -> None:
+        self._by_hash: dict[str, list[str]] = {}
+        for name in sorted(names):
+            self._by_hash.setdefault(indexed[name].file_hash, []).append(name)
+        self.algorithms = {algorithm_of(h) for h in self._by_hash}
+        self._lock = threading.Lock()
+
+    def claim(self, hashes: dict[str, str]) -> str | None:
+        """Take a vanished file with one of ``hashes`` (algorithm -> hash)."""
+        with self._lock:
+            for file_hash in hashes.values():
+                names = self._by_hash.get(file_hash)
+                if names:
+                    return names.pop(0)
+        return None
+
+    def take_unclaimed(self) -> list[str]:
+        with self._lock:
+            names = sorted(n for names in self._by_hash.values() for n in names)
+            self._by_hash.clear()
+        return names
+
+
+def _prepare_job(
+    pdf_path: Path, indexed: dict[str, FileRecord], vanished: _VanishedFiles
+) -> _FileJob | None:
+    """Decide whether (and from which page) to index a file.
+
+    A file whose size, mtime and inode match its row in ``indexed`` is
+    skipped without reading it; otherwise it is hashed, and only a changed
+    hash means re-extraction. A new file with the content of a vanished
+    one takes over that file's row.
+    """
+    rel_path = _relative(pdf_path)
+    record = indexed.get(rel_path)
+    stat = FileStat.of(pdf_path)
+    if record is not None and record.stat == stat and not _verify_due(record):
+        return None
+
+    if record is None:
+        hashes = hash_file(pdf_path, HASH_ALGORITHM, *vanished.algorithms)
+        file_hash = hashes[HASH_ALGORITHM]
+        moved_from = vanished.claim(hashes)
+        if moved_from is not None:
+            logger.info("Moved: %s -> %s", moved_from, rel_path)
+            move_file(moved_from, rel_path, stat, file_hash)
+            return None
+    else:
+        # Verify with the algorithm the stored hash was made with; if that
+        # differs from HASH_ALGORITHM the row moves over in the same read.
+        hashes = hash_file(pdf_path, algorithm_of(record.file_hash), HASH_ALGORITHM)
+        file_hash = hashes[HASH_ALGORITHM]
+        if hashes[algorithm_of(record.file_hash)] == record.file_hash:
+            logger.info("Skipping (unchanged): %s", rel_path)
+            mark_file_verified(rel_path, stat, file_hash)
+            return None
+
+    document_id = find_document(file_hash)
+    if document_id is not None and link_file(rel_path, file_hash, stat, document_id):
+        logger.info("Skipping (copy of an indexed file): %s", rel_path)
+        return None
 
     logger.info("Indexing: %s", rel_path)
-    file_id = store_file(rel_path, file_hash)
-
+    last_page, pages = load_checkpoint(file_hash)
+    if last_page:
+        logger.info("Resuming %s at page %d", rel_path, last_page + 1)
+    return _FileJob(pdf_path, rel_path, file_hash, stat, pages, last_page)
+
+
+def _prepare_jobs(
+    pdf_files: list[Path], indexed: dict[str, FileRecord], vanished: _VanishedFiles
+) -> Iterator[tuple[Path, Future]]:
+    """Yield (path, future of _prepare_job) in order, hashing ahead in parallel.
+
+    Hashing is I/O bound and hashlib releases the GIL, so files are hashed
+    on the "hashing" lane while earlier ones are being extracted.
+    """
+    executor = get_executor("hashing")
+    lookahead = executor.max_workers + executor.max_queue
+    pending: collections.deque[tuple[Path, Future]] = collections.deque()
+    for pdf_path in pdf_files:
+        if len(pending) >= lookahead:
+            yield pending.popleft()
+        pending.append(
+            (
+                pdf_path,
+                executor.submit(_prepare_job, pdf_path, indexed, vanished, block=True),
+            )
+        )
+    yield from pending
+
+
+def _link_if_stored(job: _FileJob) -> bool:
+    """Link ``job`` to its document if a copy was stored since it was prepared.
+
+    Jobs are prepared ahead of time, possibly while a file with the same
+    content was still being extracted. Otherwise this loads the OCR cache
+    for the job, now that such a twin's OCR results are in it.
+    """
+    document_id = find_document(job.file_hash)
+    if document_id is not None and link_file(
+        job.rel_path, job.file_hash, job.stat, document_id
+    ):
+        logger.info("Skipping (copy of an indexed file): %s", job.rel_path)
+        return True
+    job.cached_ocr = load_cached_ocr(job.file_hash, _ocr_profile())
+    return False
+
+
+def _finish_range(
+    job: _FileJob, first_page: int, future: Future
+) -> list[tuple[int, int]]:
+    """Record a finished page range and return further ranges to submit.
+
+    The first range of a file reveals its page count; the rest of the
+    document is then split into RANGE_PAGES ranges that workers extract
+    concurrently. Finished ranges are stitched back together in page order;
+    each time the contiguous prefix grows it is checkpointed, and once it
+    covers the whole document the file is stored.
+    """
+    job.outstanding -= 1
     try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for i, page in enumerate(pdf.pages, start=1):
-                text = _extract_text_pdfplumber(page)
-                if len(text) < MIN_TEXT_LENGTH:
-                    text = _ocr_page_image(pdf_path, i)
-                if text:
-                    store_page(file_id, i, text)
+        page_count, pages, peak_rss = future.result()
     except Exception as e:
-        logger.error("Error processing %s: %s", rel_path, e)
-        status.errors.append(f"{rel_path}: {e}")
+        # Leave the file unindexed so the next run retries it from the checkpoint.
+        if not job.failed:
+            logger.error("Error processing %s: %s", job.rel_path, e)
+            status.errors.append(f"{job.rel_path}: {e}")
+        job.failed = True
+        return []
+
+    job.peak_rss = max(job.peak_rss, peak_rss)
+    cache_ocr_pages(job.file_hash, _ocr_profile(), pages, job.cached_ocr.keys())
+    new_ranges = []
+    if job.page_count is None:
+        job.page_count = page_count
+        new_ranges = [
+            (first, min(first + RANGE_PAGES - 1, page_count))
+            for first in range(first_page + RANGE_PAGES, page_count + 1, RANGE_PAGES)
+        ]
+    job.finished[first_page] = (min(first_page + RANGE_PAGES - 1, page_count), pages)
+
+    new_pages: list[Page] = []
+    done_before = job.done_through
+    while job.done_through + 1 in job.finished:
+        job.done_through, pages = job.finished.pop(job.done_through + 1)
+        new_pages.extend(pages)
+    job.pages.extend(new_pages)
+
+    if job.done_through == job.page_count:
+        # Old version (if the file was modified) is replaced atomically.
+        document_id = store_document(job.rel_path, job.file_hash, job.pages, job.stat)
+        for rel_path, stat in job.copies:
+            link_file(rel_path, job.file_hash, stat, document_id)
+        status.recent_files = status.recent_files[-(RECENT_FILES - 1) :] + [
+            {
+                "file": job.rel_path,
+                "pages": job.page_count,
+                "seconds": round(time.monotonic() - job.started, 1),
+                "peak_rss_mb": round(job.peak_rss / 2**20, 1),
+            }
+        ]
+    elif job.done_through > done_before:
+        save_checkpoint(job.rel_path, job.file_hash, job.done_through, new_pages)
+    return new_ranges
+
+
+def _drain_progress(progress_queue) -> None:
+    while True:
+        try:
+            pid, rel_path, page, page_count = progress_queue.get_nowait()
+        except queue.Empty:
+            return
+        status.workers[pid] = {"file": rel_path, "page": page, "pages": page_count}
+
+
+def _new_pool(ctx, progress_queue, memory_budget: MemoryBudget) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=INDEX_WORKERS,
+        mp_context=ctx,
+        initializer=_init_worker,
+        initargs=(
+            progress_queue,
+            memory_budget,
+            max(1, (os.cpu_count() or 1) // INDEX_WORKERS),
+            get_engine().name,
+        ),
+    )
 
 
-def _run_indexing(clear_first: bool = False) -> None:
+def _relative(path: Path) -> str:
+    """Indexed name of ``path``: relative to /data, whatever the current dir."""
+    return str(path.relative_to(DATA_DIR))
+
+
+def _expand_changes(
+    paths: set[Path],
+) -> tuple[list[Path], set[str], dict[str, FileRecord]]:
+    """Turn changed paths into PDFs to (re)index and indexed names to drop.
+
+    A path may be a file or a directory and may no longer exist; a vanished
+    directory drops every indexed file below it. Only paths inside an
+    indexed root count. Also returns the index rows of the paths involved.
+    """
+    roots = get_index_roots()
+    pdf_files: set[Path] = set()
+    gone: list[str] = []
+    indexed: dict[str, FileRecord] = {}
+    for path in paths:
+        try:
+            rel_path = _relative(path)
+        except ValueError:
+            continue  # outside /data
+        if not is_under_root(rel_path, roots):
+            continue
+        if path.is_dir():
+            pdf_files.update(path.rglob("*.pdf"))
+            indexed.update(get_indexed_files(rel_path))
+        elif path.is_file():
+            if path.suffix == ".pdf":
+                pdf_files.add(path)
+        else:
+            gone.append(rel_path)
+    names = [_relative(p) for p in pdf_files] + gone
+    indexed.update(get_file_records([n for n in names if n not in indexed]))
+
+    deleted: set[str] = set()
+    for rel_path in gone:
+        if rel_path in indexed:
+            deleted.add(rel_path)
+        else:
+            below = get_indexed_files(rel_path)
+            indexed.update(below)
+            deleted.update(below)
+    return sorted(pdf_files), deleted, indexed
+
+
+def _run_indexing(clear_first: bool = False, paths: set[Path] | None = None) -> None:
+    """Index the current directory, or only ``paths`` (e.g. from the watcher).
+
+    ``clear_first`` rebuilds the index from scratch in a new generation;
+    searches are served from the old one until the rebuild is complete.
+    Filling an empty index (a rebuild, or the first run) uses bulk_load().
+    """
     global status
     status.errors = []
 
-    if clear_first:
-        clear_index()
+    if not clear_first:
+        if paths is not None or get_indexed_count():
+            _index_files(paths)
+            return
+        with bulk_load() as status.bulk_load:
+            _index_files(None)
+        return
+    # The rebuilt index covers every directory the current one does.
+    scopes = _rebuild_scopes(get_index_roots() + [get_current_dir()])
+    status.rebuild = "running"
+    begin_rebuild()
+    try:
+        with bulk_load() as status.bulk_load:
+            on_disk = _index_files(None, scopes)
+    except BaseException:
+        status.rebuild = "discarded"
+        abort_rebuild()
+        raise
+    # Files that failed are left out, as with any run, and retried by the
+    # next one; only a run that indexed nothing at all is not trusted.
+    if on_disk and not get_indexed_count():
+        logger.error(
+            "Rebuild indexed none of %d files, keeping the current index", on_disk
+        )
+        status.rebuild = "discarded"
+        abort_rebuild()
+        return
+    finish_rebuild()
+    status.rebuild = "swapped"
+
+
+def _rebuild_scopes(roots: list[str]) -> list[str]:
+    """Existing directories among ``roots``, without those inside another one."""
+    scopes = [r for r in roots if (DATA_DIR / r).is_dir()]
+    return sorted(
+        {r for r in scopes if not is_under_root(r, [o for o in scopes if o != r])}
+    )
 
-    pdf_files = sorted(_current_dir.rglob("*.pdf"))
-    disk_filenames = {str(p.relative_to(_current_dir)) for p in pdf_files}
 
-    # Remove deleted files from index
-    indexed_filenames = get_indexed_filenames()
-    for deleted in indexed_filenames - disk_filenames:
-        logger.info("Removing deleted file from index: %s", deleted)
-        delete_file_by_name(deleted)
+def _index_files(paths: set[Path] | None, scopes: list[str] | None = None) -> int:
+    """Index the ``scopes`` directories (default: the current one), or only ``paths``.
+
+    Files of other directories stay in the index: a full run only touches
+    its subtrees and then records them as indexed roots. Returns the
+    number of PDFs found.
+    """
+    scopes = scopes if scopes is not None else [get_current_dir()]
+    if paths is None:
+        indexed: dict[str, FileRecord] = {}
+        pdf_files = []
+        for scope in scopes:
+            indexed.update(get_indexed_files(scope))
+            pdf_files.extend((DATA_DIR / scope).rglob("*.pdf"))
+        pdf_files.sort()
+        disk_filenames = {_relative(p) for p in pdf_files}
+        deleted_files = indexed.keys() - disk_filenames
+    else:
+        pdf_files, deleted_files, indexed = _expand_changes(paths)
+
+    # Files gone from disk are only removed once every new file has been
+    # hashed: any of them may turn out to have just moved.
+    vanished = _VanishedFiles(indexed, deleted_files)
 
     status.total_files = len(pdf_files)
     status.processed_files = 0
 
-    for pdf_path in pdf_files:
-        status.current_file = pdf_path.name
-        try:
-            _index_single_file(pdf_path)
-        except Exception as e:
-            logger.error("Unexpected error for %s: %s", pdf_path, e)
-            status.errors.append(f"{pdf_path.name}: {e}")
-        status.processed_files += 1
+    ctx = multiprocessing.get_context("spawn")
+    progress_queue = ctx.Queue()
+    memory_budget = MemoryBudget(OCR_MEMORY_BUDGET_MB * 1024 * 1024, ctx)
+    pool = _new_pool(ctx, progress_queue, memory_budget)
+    pool_futures: set[Future] = set()  # futures submitted to the current pool
+    in_flight: dict[Future, tuple[_FileJob, int]] = {}
+    extracting: dict[str, _FileJob] = {}  # file hash -> job
+    progress_since_crash = True  # a range finished since the pool last broke
+    remaining = _prepare_jobs(pdf_files, indexed, vanished)
+
+    def submit(job: _FileJob, first_page: int, last_page: int) -> None:
+        cached_ocr = {
+            n: text
+            for n, text in job.cached_ocr.items()
+            if first_page <= n <= last_page
+        }
+        future = pool.submit(
+            _extract_range,
+            str(job.path),
+            job.rel_path,
+            first_page,
+            last_page,
+            cached_ocr,
+        )
+        pool_futures.add(future)
+        in_flight[future] = (job, first_page)
+        job.outstanding += 1
 
-    status.current_file = ""
+    try:
+        while True:
+            # Keep every worker busy, with one range queued behind each.
+            while len(in_flight) < 2 * INDEX_WORKERS:
+                pdf_path, prepared = next(remaining, (None, None))
+                if pdf_path is None:
+                    # Every new file is hashed: the unclaimed ones are gone.
+                    for deleted in vanished.take_unclaimed():
+                        logger.info("Removing deleted file from index: %s", deleted)
+                        delete_file_by_name(deleted)
+                    break
+                status.current_file = pdf_path.name
+                try:
+                    job = prepared.result()
+                except Exception as e:
+                    logger.error("Unexpected error for %s: %s", pdf_path, e)
+                    status.errors.append(f"{pdf_path.name}: {e}")
+                    job = None
+                if job is not None and job.file_hash in extracting:
+                    # Same content as a file being extracted right now.
+                    extracting[job.file_hash].copies.append((job.rel_path, job.stat))
+                    job = None
+                elif job is not None and _link_if_stored(job):
+                    job = None
+                if job is None:
+                    status.processed_files += 1
+                else:
+                    extracting[job.file_hash] = job
+                    first = job.done_through + 1
+                    submit(job, first, first + RANGE_PAGES - 1)
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+            _drain_progress(progress_queue)
+            for future in done:
+                job, first_page = in_flight.pop(future)
+                if future in pool_futures and isinstance(
+                    future.exception(), BrokenProcessPool
+                ):
+                    # A worker died (crash or OOM kill) and took the pool with
+                    # it. Start a fresh one for the remaining work; the dead
+                    # workers' budget reservations die with the old budget.
+                    # If that one broke too without finishing anything, the
+                    # workers cannot run at all: fail the run.
+                    if not progress_since_crash:
+                        raise RuntimeError("Indexing workers keep crashing")
+                    progress_since_crash = False
+                    pool.shutdown(wait=False)
+                    memory_budget = MemoryBudget(memory_budget.limit, ctx)
+                    pool = _new_pool(ctx, progress_queue, memory_budget)
+                    pool_futures.clear()
+                elif not isinstance(future.exception(), BrokenProcessPool):
+                    progress_since_crash = True
+                pool_futures.discard(future)
+                for first, last in _finish_range(job, first_page, future):
+                    submit(job, first, last)
+                if job.outstanding == 0:
+                    extracting.pop(job.file_hash, None)
+                    status.processed_files += 1
+    finally:
+        pool.shutdown(cancel_futures=True)
+        status.workers.clear()
+        status.current_file = ""
+
+    if paths is None:
+        for scope in scopes:
+            add_index_root(scope)
+    return len(pdf_files)
 
 
 def check_for_changes() -> dict:
     """Compare PDF files on disk with indexed files to detect new/deleted."""
-    disk_files = {str(p.relative_to(_current_dir)) for p in _current_dir.rglob("*.pdf")}
-    indexed_files = get_indexed_filenames()
+    disk_files = {_relative(p) for p in _current_dir.rglob("*.pdf")}
+    indexed_files = get_indexed_filenames(get_current_dir())
     new_count = len(disk_files - indexed_files)
     deleted_count = len(indexed_files - disk_files)
     return {
@@ -156,16 +891,23 @@ def check_for_changes() -> dict:
     }
 
 
-async def run_indexing_async(clear_first: bool = False) -> None:
+def indexing_in_progress() -> bool:
+    return _lock.locked()
+
+
+async def run_indexing_async(
+    clear_first: bool = False, paths: set[Path] | None = None
+) -> bool:
+    """Run an indexing pass; returns False if one was already in progress."""
     global status
     if _lock.locked():
         logger.warning("Indexing already in progress, skipping.")
-        return
+        return False
 
     async with _lock:
         status.is_running = True
         try:
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, _run_indexing, clear_first)
+            await get_executor("indexing").run(_run_indexing, clear_first, paths)
         finally:
             status.is_running = False
+    return True
@@ -8,10 +8,23 @@ from fastapi import FastAPI, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pdf2image import convert_from_path
-from PIL import ImageDraw
+from PIL import Image, ImageDraw
 from pydantic import BaseModel
 
-from app.backend.database import get_stats, init_db, search
+from app.backend.database import (
+    close_db,
+    get_index_roots,
+    get_stats,
+    init_db,
+    is_under_root,
+    search,
+)
+from app.backend.executors import (
+    ExecutorBusy,
+    executor_stats,
+    get_executor,
+    shutdown_executors,
+)
 from app.backend.indexer import (
     DATA_DIR,
     check_for_changes,
@@ -20,6 +33,8 @@ from app.backend.indexer import (
     set_current_dir,
     status,
 )
+from app.backend.ocr_cache import close_ocr_cache, init_ocr_cache, ocr_cache_stats
+from app.backend.watcher import start_watcher, stop_watcher, watcher_changes
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s"
@@ -30,6 +45,16 @@ app = FastAPI(title="PDF Search")
 DPI = 150
 SCALE = DPI / 72  # pdfplumber uses 72 points/inch
 
+Image.MAX_IMAGE_PIXELS = 300_000_000  # allow previews of large-format pages
+
+
+async def _run_db(func, *args, **kwargs):
+    """Run a SQLite query on the db lane so a slow MATCH never blocks the loop."""
+    try:
+        return await get_executor("db").run(func, *args, **kwargs)
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
 
 class SearchRequest(BaseModel):
     query: str
@@ -42,7 +67,17 @@ class SetDirectoryRequest(BaseModel):
 @app.on_event("startup")
 async def startup() -> None:
     init_db()
+    init_ocr_cache()
     asyncio.create_task(run_indexing_async())
+    start_watcher(asyncio.get_running_loop())
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    stop_watcher()
+    shutdown_executors()
+    close_db()
+    close_ocr_cache()
 
 
 @app.post("/search")
@@ -50,18 +85,22 @@ async def search_endpoint(req: SearchRequest):
     if not req.query.strip():
         return {"results": []}
     try:
-        results = search(req.query)
+        results = await _run_db(search, req.query, get_current_dir())
+    except HTTPException:
+        raise
     except Exception:
         return {"results": [], "error": "Invalid search query"}
     return {"results": results}
 
 
 @app.post("/reindex")
-async def reindex_endpoint():
+async def reindex_endpoint(
+    full: bool = Query(False, description="Rebuild the index from scratch"),
+):
     if status.is_running:
         return {"message": "Indexing already in progress"}
-    asyncio.create_task(run_indexing_async())
-    return {"message": "Reindexing started"}
+    asyncio.create_task(run_indexing_async(clear_first=full))
+    return {"message": "Full rebuild started" if full else "Reindexing started"}
 
 
 @app.get("/indexing-status")
@@ -72,12 +111,21 @@ async def indexing_status_endpoint():
         "processed_files": status.processed_files,
         "current_file": status.current_file,
         "errors": status.errors,
+        "workers": status.workers,
+        "recent_files": status.recent_files,
+        "bulk_load": status.bulk_load,
+        "rebuild": status.rebuild,
     }
 
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    return {"executors": executor_stats(), "ocr_cache": ocr_cache_stats()}
+
+
 @app.get("/stats")
 async def stats_endpoint():
-    return get_stats()
+    return await _run_db(get_stats, get_current_dir())
 
 
 @app.get("/current-directory")
@@ -131,7 +179,10 @@ async def file_page_count_endpoint(
 async def changes_detected_endpoint():
     if status.is_running:
         return {"has_changes": False, "new_files": 0, "deleted_files": 0}
-    return check_for_changes()
+    changes = watcher_changes()
+    if changes is not None:
+        return changes
+    return await _run_db(check_for_changes)
 
 
 @app.post("/set-directory")
@@ -140,10 +191,15 @@ async def set_directory_endpoint(req: SetDirectoryRequest):
         set_current_dir(req.path)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    # The index keeps every directory indexed so far; search and stats are
+    # scoped to the current one, so switching to an indexed one is instant.
+    roots = await _run_db(get_index_roots)
+    if is_under_root(get_current_dir(), roots):
+        return {"message": "Directory changed"}
     if status.is_running:
         return {"message": "Directory changed, but indexing already in progress"}
-    asyncio.create_task(run_indexing_async(clear_first=True))
-    return {"message": "Directory changed, reindexing started"}
+    asyncio.create_task(run_indexing_async())
+    return {"message": "Directory changed, indexing started"}
 
 
 @lru_cache(maxsize=50)
@@ -193,9 +249,11 @@ async def page_image_endpoint(
         raise HTTPException(status_code=404, detail="File not found")
 
     try:
-        data = await asyncio.get_event_loop().run_in_executor(
-            None, _render_page, str(pdf_path), page, query.strip()
+        data = await get_executor("render").run(
+            _render_page, str(pdf_path), page, query.strip()
         )
+    except ExecutorBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Render error: {e}")
 
@@ -0,0 +1,267 @@
+"""Versioned schema migrations for the index database.
+
+The schema version is kept in ``PRAGMA user_version``. Each migration
+upgrades the schema by exactly one version inside its own transaction, so
+an existing index is brought up to date in place on startup instead of
+having to be rebuilt (and re-OCR'd) from scratch. Append new migrations to
+``MIGRATIONS``; never edit one that has already shipped.
+"""
+
+import logging
+import sqlite3
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+def db_size(conn: sqlite3.Connection) -> int:
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size
+
+
+def _v1_base_schema(conn: sqlite3.Connection) -> bool:
+    """Tables as created by the unversioned init_db (no-op on old databases)."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pdf_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            file_hash TEXT NOT NULL,
+            indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS pdf_pages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id INTEGER NOT NULL REFERENCES pdf_files(id) ON DELETE CASCADE,
+            page_number INTEGER NOT NULL,
+            content TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS pdf_pages_fts USING fts5(
+            content,
+            content='pdf_pages',
+            content_rowid='id'
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS index_checkpoints (
+            file_hash TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            last_page INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS checkpoint_pages (
+            file_hash TEXT NOT NULL
+                REFERENCES index_checkpoints(file_hash) ON DELETE CASCADE,
+            page_number INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            PRIMARY KEY (file_hash, page_number)
+        )
+    """)
+    return False
+
+
+def _v2_fts_external_content(conn: sqlite3.Connection) -> bool:
+    """Stop storing a second copy of page text inside pdf_pages_fts."""
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE name = 'pdf_pages_fts'"
+    ).fetchone()
+    if "content='pdf_pages'" in row[0]:
+        return False
+    conn.execute("DROP TABLE pdf_pages_fts")
+    conn.execute("""
+        CREATE VIRTUAL TABLE pdf_pages_fts USING fts5(
+            content,
+            content='pdf_pages',
+            content_rowid='id'
+        )
+    """)
+    conn.execute("INSERT INTO pdf_pages_fts (pdf_pages_fts) VALUES ('rebuild')")
+    return True
+
+
+def _v3_lookup_indexes(conn: sqlite3.Connection) -> bool:
+    """Index the columns used by file lookups, deletes and page joins."""
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_pdf_files_filename_hash "
+        "ON pdf_files(filename, file_hash)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_pdf_pages_file_id "
+        "ON pdf_pages(file_id, page_number)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_index_checkpoints_filename "
+        "ON index_checkpoints(filename)"
+    )
+    return False
+
+
+def _v4_page_classification(conn: sqlite3.Connection) -> bool:
+    """Record how each page's text was obtained (text layer, OCR or skipped)."""
+    for table in ("pdf_pages", "checkpoint_pages"):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN method TEXT")
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN reason TEXT")
+    return False
+
+
+def _v5_file_stat(conn: sqlite3.Connection) -> bool:
+    """Remember each file's size, mtime and inode to skip rehashing it."""
+    for column in ("size", "mtime_ns", "inode"):
+        conn.execute(f"ALTER TABLE pdf_files ADD COLUMN {column} INTEGER")
+    conn.execute("ALTER TABLE pdf_files ADD COLUMN verified_at TIMESTAMP")
+    return False
+
+
+def _v6_content_addressed_pages(conn: sqlite3.Connection) -> bool:
+    """Store pages once per distinct file content instead of once per path.
+
+    pdf_documents holds one row per content hash and owns the pages;
+    pdf_files becomes a path -> document mapping. Duplicate copies of a
+    document keep the pages of their lowest file id, and the other copies'
+    pages are removed from pdf_pages and the full-text index.
+    """
+    conn.execute("""
+        CREATE TABLE pdf_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_hash TEXT NOT NULL UNIQUE,
+            indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute(
+        "INSERT INTO pdf_documents (file_hash, indexed_at) "
+        "SELECT file_hash, MIN(indexed_at) FROM pdf_files GROUP BY file_hash"
+    )
+    conn.execute(
+        "ALTER TABLE pdf_files ADD COLUMN document_id INTEGER "
+        "REFERENCES pdf_documents(id)"
+    )
+    conn.execute(
+        "UPDATE pdf_files SET document_id = "
+        "(SELECT id FROM pdf_documents d WHERE d.file_hash = pdf_files.file_hash)"
+    )
+    conn.execute(
+        "CREATE INDEX idx_pdf_files_document_id ON pdf_files(document_id)"
+    )
+
+    conn.execute("""
+        CREATE TABLE pdf_pages_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL
+                REFERENCES pdf_documents(id) ON DELETE CASCADE,
+            page_number INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            method TEXT,
+            reason TEXT
+        )
+    """)
+    # Page ids are kept: they are the rowids of the full-text index.
+    conn.execute("""
+        INSERT INTO pdf_pages_new (id, document_id, page_number, content, method, reason)
+        SELECT p.id, f.document_id, p.page_number, p.content, p.method, p.reason
+        FROM pdf_pages p
+        JOIN pdf_files f ON f.id = p.file_id
+        WHERE f.id = (
+            SELECT MIN(id) FROM pdf_files WHERE document_id = f.document_id
+        )
+    """)
+    dropped = conn.execute(
+        "SELECT COUNT(*) FROM pdf_pages WHERE id NOT IN (SELECT id FROM pdf_pages_new)"
+    ).fetchone()[0]
+    conn.execute("""
+        INSERT INTO pdf_pages_fts (pdf_pages_fts, rowid, content)
+        SELECT 'delete', id, content FROM pdf_pages
+        WHERE id NOT IN (SELECT id FROM pdf_pages_new)
+    """)
+    conn.execute("DROP TABLE pdf_pages")
+    conn.execute("ALTER TABLE pdf_pages_new RENAME TO pdf_pages")
+    conn.execute(
+        "CREATE INDEX idx_pdf_pages_document_id ON pdf_pages(document_id, page_number)"
+    )
+    logger.info("Removed %d pages of duplicate files", dropped)
+    return dropped > 0
+
+
+def _v7_index_roots(conn: sqlite3.Connection) -> bool:
+    """Index each file's directory and remember which subtrees are indexed."""
+    conn.execute("ALTER TABLE pdf_files ADD COLUMN directory TEXT NOT NULL DEFAULT ''")
+    # rtrim(filename, <all characters but '/'>) cuts the name after the last '/'.
+    conn.execute(
+        "UPDATE pdf_files SET directory = "
+        "rtrim(rtrim(filename, replace(filename, '/', '')), '/')"
+    )
+    conn.execute("CREATE INDEX idx_pdf_files_directory ON pdf_files(directory)")
+    conn.execute("""
+        CREATE TABLE index_roots (
+            path TEXT PRIMARY KEY,
+            indexed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return False
+
+
+def _v8_index_state(conn: sqlite3.Connection) -> bool:
+    """Durable flags about the index itself, e.g. an FTS build still pending."""
+    conn.execute("""
+        CREATE TABLE index_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    return False
+
+
+# MIGRATIONS[i] upgrades the schema from version i to i + 1. A migration
+# returns True when it freed enough space that the file should be vacuumed.
+MIGRATIONS: list[Callable[[sqlite3.Connection], bool]] = [
+    _v1_base_schema,
+    _v2_fts_external_content,
+    _v3_lookup_indexes,
+    _v4_page_classification,
+    _v5_file_stat,
+    _v6_content_addressed_pages,
+    _v7_index_roots,
+    _v8_index_state,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn: sqlite3.Connection) -> None:
+    """Upgrade the database to SCHEMA_VERSION.
+
+    ``conn`` must not be inside a transaction.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Index database schema v{version} is newer than this application "
+            f"(v{SCHEMA_VERSION})"
+        )
+    if version == SCHEMA_VERSION:
+        return
+
+    size_before = db_size(conn)
+    vacuum = False
+    for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        logger.info("Migrating index database to v%d (%s)", target, migration.__name__)
+        conn.execute("BEGIN")
+        try:
+            vacuum |= migration(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    if vacuum:
+        conn.execute("VACUUM")
+        logger.info(
+            "Index database vacuumed: %.1f MB -> %.1f MB",
+            size_before / 1e6,
+            db_size(conn) / 1e6,
+        )
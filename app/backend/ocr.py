@@ -0,0 +1,106 @@
+"""OCR engines.
+
+The default engine drives Tesseract in-process through tesserocr and keeps
+one initialised API per thread, so the Polish traineddata is loaded once
+per OCR thread instead of once per page. pytesseract, which starts a
+``tesseract`` process for every page, is the fallback when tesserocr is
+not installed. ``OCR_ENGINE`` selects ``auto`` (default), ``tesserocr`` or
+``pytesseract``.
+"""
+
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # optional, needs libtesseract at build time
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+OCR_LANG = "pol"
+OCR_ENGINE = os.environ.get("OCR_ENGINE", "auto")
+
+
+@dataclass
+class OcrResult:
+    text: str
+    confidence: float | None  # mean word confidence 0-100, if the engine has one
+
+
+class OcrEngine:
+    name = ""
+
+    def recognize(self, image_path: str) -> OcrResult:
+        raise NotImplementedError
+
+
+class PytesseractEngine(OcrEngine):
+    """Runs the tesseract CLI once per image."""
+
+    name = "pytesseract"
+
+    def recognize(self, image_path: str) -> OcrResult:
+        text = pytesseract.image_to_string(image_path, lang=OCR_LANG)
+        return OcrResult(text.strip(), None)
+
+
+class TesserocrEngine(OcrEngine):
+    """Keeps a warm tesserocr API per thread (the API is not thread-safe)."""
+
+    name = "tesserocr"
+
+    def __init__(self) -> None:
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self._local = threading.local()
+        self._api()  # fail early if the language data cannot be loaded
+
+    def _api(self):
+        api = getattr(self._local, "api", None)
+        if api is None:
+            api = tesserocr.PyTessBaseAPI(lang=OCR_LANG)
+            self._local.api = api
+        return api
+
+    def recognize(self, image_path: str) -> OcrResult:
+        api = self._api()
+        try:
+            api.SetImageFile(image_path)
+            text = api.GetUTF8Text()
+            confidence = float(api.MeanTextConf())
+        finally:
+            api.Clear()
+        return OcrResult(text.strip(), confidence)
+
+
+ENGINES: dict[str, type[OcrEngine]] = {
+    "tesserocr": TesserocrEngine,
+    "pytesseract": PytesseractEngine,
+}
+
+_engine: OcrEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def create_engine(name: str) -> OcrEngine:
+    if name != "auto":
+        return ENGINES[name]()
+    try:
+        return TesserocrEngine()
+    except Exception as e:
+        logger.info("tesserocr unavailable (%s), using pytesseract", e)
+        return PytesseractEngine()
+
+
+def get_engine(name: str = OCR_ENGINE) -> OcrEngine:
+    """Return this process's OCR engine, created on first use."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_engine(name)
+        return _engine
@@ -0,0 +1,176 @@
+"""Persistent cache of OCR results, independent of the search index.
+
+OCR text is keyed by (file hash, page number, OCR profile), where the
+profile captures every setting that changes the result (engine, language,
+resolution limits, colour mode, retry threshold). It lives in its own
+database file, so clearing the index or switching directories does not
+throw away OCR work: re-indexing a file seen before costs a lookup.
+
+The cache is bounded by OCR_CACHE_MAX_MB; the least recently used pages
+are evicted first (0 disables the cache). Only the indexing thread writes
+to it.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Collection
+
+from app.backend.database import ConnectionManager, Page
+
+logger = logging.getLogger(__name__)
+
+OCR_CACHE_PATH = Path("/data/.pdf_search_ocr_cache.db")
+OCR_CACHE_MAX_MB = int(os.environ.get("OCR_CACHE_MAX_MB", "1024"))
+EVICT_BATCH = 1000
+
+# Incremental auto-vacuum lets the file shrink after eviction.
+_cache = ConnectionManager(OCR_CACHE_PATH, auto_vacuum="INCREMENTAL")
+_lock = threading.Lock()
+_size = 0  # bytes of cached text, kept in step with the table by the writer
+_hits = 0
+_misses = 0
+
+
+def enabled() -> bool:
+    return OCR_CACHE_MAX_MB > 0
+
+
+def init_ocr_cache() -> None:
+    global _size
+    if not enabled():
+        return
+    with _cache.writer() as conn:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Created without it (by an earlier version): VACUUM applies it.
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ocr_cache (
+                file_hash TEXT NOT NULL,
+                page_number INTEGER NOT NULL,
+                profile TEXT NOT NULL,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                used_at INTEGER NOT NULL,
+                PRIMARY KEY (file_hash, profile, page_number)
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_ocr_cache_used_at ON ocr_cache(used_at)"
+        )
+        _size = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM ocr_cache"
+        ).fetchone()[0]
+
+
+def load_cached_ocr(file_hash: str, profile: str) -> dict[int, str]:
+    """Return page number -> cached OCR text for a file."""
+    if not enabled():
+        return {}
+    with _cache.reader() as conn:
+        rows = conn.execute(
+            "SELECT page_number, content FROM ocr_cache "
+            "WHERE file_hash = ? AND profile = ?",
+            (file_hash, profile),
+        ).fetchall()
+        return {r["page_number"]: r["content"] for r in rows}
+
+
+def cache_ocr_pages(
+    file_hash: str, profile: str, pages: list[Page], cached: Collection[int]
+) -> None:
+    """Record OCR'd ``pages``; ``cached`` are the ones that came from the cache.
+
+    Cached pages only have their last use refreshed.
+    """
+    global _size, _hits, _misses
+    pages = [p for p in pages if p.method == "ocr"]
+    if not enabled() or not pages:
+        return
+    now = int(time.time())
+    with _lock:
+        hits = sum(p.number in cached for p in pages)
+        _hits += hits
+        _misses += len(pages) - hits
+    try:
+        _store(file_hash, profile, pages, now)
+    except sqlite3.Error as e:
+        # Losing a cache entry only costs OCR time later; never fail indexing.
+        logger.warning("OCR cache write failed: %s", e)
+
+
+def _store(file_hash: str, profile: str, pages: list[Page], now: int) -> None:
+    global _size
+    with _cache.writer() as conn:
+        for page in pages:
+            size = len(page.text.encode("utf-8"))
+            old = conn.execute(
+                "SELECT size FROM ocr_cache "
+                "WHERE file_hash = ? AND profile = ? AND page_number = ?",
+                (file_hash, profile, page.number),
+            ).fetchone()
+            conn.execute(
+                """INSERT INTO ocr_cache
+                     (file_hash, page_number, profile, content, size, used_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(file_hash, profile, page_number) DO UPDATE SET
+                     content = excluded.content,
+                     size = excluded.size,
+                     used_at = excluded.used_at""",
+                (file_hash, page.number, profile, page.text, size, now),
+            )
+            _size += size - (old["size"] if old is not None else 0)
+        evicted = _evict(conn)
+    if evicted:
+        with _cache.writer() as conn:
+            # execute() would step the pragma once, freeing a single page.
+            conn.executescript("PRAGMA incremental_vacuum")
+
+
+def _evict(conn) -> int:
+    """Drop least recently used pages until the cache fits its limit."""
+    global _size
+    limit = OCR_CACHE_MAX_MB * 1024 * 1024
+    evicted = 0
+    while _size > limit:
+        rows = conn.execute(
+            "SELECT rowid, size FROM ocr_cache ORDER BY used_at LIMIT ?",
+            (EVICT_BATCH,),
+        ).fetchall()
+        if not rows:
+            break
+        freed = 0
+        drop = []
+        for row in rows:
+            drop.append(row["rowid"])
+            freed += row["size"]
+            if _size - freed <= limit:
+                break
+        conn.execute(
+            f"DELETE FROM ocr_cache WHERE rowid IN ({', '.join('?' * len(drop))})",
+            drop,
+        )
+        _size -= freed
+        evicted += len(drop)
+    if evicted:
+        logger.info("OCR cache: evicted %d pages", evicted)
+    return evicted
+
+
+def ocr_cache_stats() -> dict:
+    with _lock:
+        return {
+            "enabled": enabled(),
+            "size_bytes": _size,
+            "max_bytes": OCR_CACHE_MAX_MB * 1024 * 1024,
+            "hits": _hits,
+            "misses": _misses,
+        }
+
+
+def close_ocr_cache() -> None:
+    _cache.close()
@@ -0,0 +1,225 @@
+"""Filesystem watcher that keeps the index up to date between reindexes.
+
+Created, modified, deleted and moved PDFs (and directories) under /data are
+collected per path and handed to an incremental indexing run once the path
+has been quiet for WATCH_DEBOUNCE_SECONDS, so a file still being copied is
+not indexed half-written. ``WATCH_MODE`` selects ``auto`` (default: inotify,
+or polling when /data is a network mount, where inotify sees no remote
+changes), ``inotify``, ``polling`` or ``off``.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from app.backend.indexer import DATA_DIR, indexing_in_progress, run_indexing_async
+
+logger = logging.getLogger(__name__)
+
+WATCH_MODE = os.environ.get("WATCH_MODE", "auto")
+WATCH_DEBOUNCE_SECONDS = float(os.environ.get("WATCH_DEBOUNCE_SECONDS", "2"))
+WATCH_POLL_INTERVAL = float(os.environ.get("WATCH_POLL_INTERVAL", "60"))
+# Filesystems on which inotify does not report changes made by other hosts.
+NETWORK_FILESYSTEMS = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "fuse.sshfs"}
+
+
+def _filesystem_type(path: Path) -> str | None:
+    """Return the type of the filesystem ``path`` is on, from /proc/mounts."""
+    path = str(path.resolve())
+    best, fstype = "", None
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount = fields[1].replace("\\040", " ")
+                inside = path == mount or path.startswith(mount.rstrip("/") + "/")
+                if inside and len(mount) > len(best):
+                    best, fstype = mount, fields[2]
+    except OSError:
+        pass
+    return fstype
+
+
+class Watcher:
+    """Collects filesystem events and flushes debounced batches to ``on_changes``.
+
+    Nothing is flushed while ``busy()`` is true (an indexing run is in
+    progress, which may take hours); changes keep accumulating meanwhile.
+    ``on_changes(paths)`` returns False when it could not take the batch
+    after all; the paths are then retried.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        on_changes: Callable[[set[Path]], bool],
+        busy: Callable[[], bool],
+    ) -> None:
+        self.root = root
+        self.mode: str | None = None
+        self._on_changes = on_changes
+        self._busy = busy
+        self._lock = threading.Lock()
+        # path -> (kind, time of the last event); kind is "changed" or "deleted"
+        self._pending: dict[Path, tuple[str, float]] = {}
+        self._stop = threading.Event()
+        self._observer = None
+        self._thread: threading.Thread | None = None
+
+    # Called by watchdog's observer thread for every event.
+    def dispatch(self, event) -> None:
+        kind = event.event_type
+        if event.is_directory and kind not in ("created", "deleted", "moved"):
+            return
+        if kind == "moved":
+            self._record(event.src_path, event.is_directory, "deleted")
+            self._record(event.dest_path, event.is_directory, "changed")
+        elif kind == "deleted":
+            self._record(event.src_path, event.is_directory, "deleted")
+        elif kind in ("created", "modified", "closed"):
+            self._record(event.src_path, event.is_directory, "changed")
+
+    def _record(self, path: str | bytes, is_directory: bool, kind: str) -> None:
+        path = os.fsdecode(path)
+        if not is_directory and not path.endswith(".pdf"):
+            return
+        with self._lock:
+            self._pending[Path(path)] = (kind, time.monotonic())
+
+    def _take_ready(self) -> dict[Path, str]:
+        """Remove and return the paths quiet for the debounce time, with their kind."""
+        quiet_since = time.monotonic() - WATCH_DEBOUNCE_SECONDS
+        with self._lock:
+            ready = {
+                p: kind for p, (kind, t) in self._pending.items() if t <= quiet_since
+            }
+            for path in ready:
+                del self._pending[path]
+        return ready
+
+    def _requeue(self, batch: dict[Path, str]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for path, kind in batch.items():
+                # Retried after another debounce period unless a newer
+                # event came in meanwhile.
+                self._pending.setdefault(path, (kind, now))
+
+    def _flush_loop(self) -> None:
+        while not self._stop.wait(WATCH_DEBOUNCE_SECONDS / 2):
+            if self._busy():
+                continue
+            batch = self._take_ready()
+            if not batch:
+                continue
+            try:
+                accepted = self._on_changes(set(batch))
+            except Exception as e:
+                logger.error("Incremental indexing failed: %s", e)
+                accepted = False
+            if not accepted:
+                self._requeue(batch)
+
+    def changes(self) -> dict:
+        """Pending (not yet indexed) changes, shaped like check_for_changes()."""
+        with self._lock:
+            deleted = sum(kind == "deleted" for kind, _ in self._pending.values())
+            changed = len(self._pending) - deleted
+        return {
+            "has_changes": bool(changed or deleted),
+            "new_files": changed,
+            "deleted_files": deleted,
+        }
+
+    def _start_observer(self, mode: str):
+        from watchdog.observers import Observer
+        from watchdog.observers.polling import PollingObserver
+
+        observer = (
+            PollingObserver(timeout=WATCH_POLL_INTERVAL)
+            if mode == "polling"
+            else Observer()
+        )
+        observer.schedule(self, str(self.root), recursive=True)
+        observer.start()
+        return observer
+
+    def start(self) -> None:
+        mode = WATCH_MODE
+        if mode == "auto":
+            fstype = _filesystem_type(self.root)
+            mode = "polling" if fstype in NETWORK_FILESYSTEMS else "inotify"
+        try:
+            self._observer = self._start_observer(mode)
+        except OSError as e:
+            # e.g. fs.inotify.max_user_watches exhausted on a huge tree
+            if WATCH_MODE != "auto" or mode == "polling":
+                raise
+            logger.warning("inotify watch failed (%s), falling back to polling", e)
+            mode = "polling"
+            self._observer = self._start_observer(mode)
+        self.mode = mode
+        self._thread = threading.Thread(
+            target=self._flush_loop, name="watcher", daemon=True
+        )
+        self._thread.start()
+        logger.info("Watching %s for changes (%s)", self.root, mode)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+_watcher: Watcher | None = None
+
+
+def start_watcher(loop: asyncio.AbstractEventLoop) -> None:
+    """Start watching DATA_DIR, indexing changes through ``loop``."""
+    global _watcher
+    if WATCH_MODE == "off":
+        return
+    try:
+        import watchdog  # noqa: F401
+    except ImportError:
+        logger.warning("watchdog is not installed, filesystem watching disabled")
+        return
+
+    async def index_if_idle(paths: set[Path]) -> bool:
+        # Checked on the loop, so no run can start in between: a run begun
+        # since the watcher's busy() check just defers the batch, quietly.
+        if indexing_in_progress():
+            return False
+        return await run_indexing_async(paths=paths)
+
+    def index_changes(paths: set[Path]) -> bool:
+        future = asyncio.run_coroutine_threadsafe(index_if_idle(paths), loop)
+        return future.result()
+
+    _watcher = Watcher(DATA_DIR, index_changes, indexing_in_progress)
+    try:
+        _watcher.start()
+    except Exception as e:
+        logger.error("Could not watch %s: %s", DATA_DIR, e)
+        _watcher = None
+
+
+def stop_watcher() -> None:
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
+
+
+def watcher_changes() -> dict | None:
+    """Pending changes seen by the watcher, or None when it is not running."""
+    return _watcher.changes() if _watcher is not None else None